@@ -0,0 +1,232 @@
+"""
+Per-message latency of GameConsumer handlers and the DB executor queue depth
+they cause: the old handlers, which made one db_sync_to_async call per lookup
+(player, session, already-answered check, insert), against the current ones,
+which cache the player's seat on connect and do each frame in a single call.
+
+Every client is the only player in its own session, so each frame produces
+exactly one broadcast back to the sender; latency is send to broadcast.
+
+    python benchmarks/consumer_hops.py --clients 50 --frames 40 --interval-ms 200 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+import django
+django.setup()
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.dispatch import receiver
+from django.utils import timezone
+from game import json_codec
+from game.consumers import GameConsumer
+from game.db_pool import db_sync_to_async, executor_stats, get_db_executor
+from game.models import ChatMessage, GameSession, Player, QuizAnswer, QuizQuestion, User
+from game.ratelimit import rate_limited
+
+# No Redis needed, and no frame should be throttled
+settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+settings.RATE_LIMITS = {}
+# Take the write lock at BEGIN (Django 5.1's transaction_mode='IMMEDIATE'), so
+# concurrent atomic blocks wait on busy_timeout rather than fail the upgrade
+SQLiteDatabaseWrapper._start_transaction_under_autocommit = lambda self: self.cursor().execute('BEGIN IMMEDIATE')
+
+@receiver(connection_created)
+def wait_for_sqlite_lock(sender, connection, **kwargs):
+    # SQLite serialises writers; queue for the lock instead of failing
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=60000')
+        cursor.execute('PRAGMA synchronous=OFF')
+
+class LegacyConsumer(GameConsumer):
+    """The chat and quiz handlers as they were, one call per lookup"""
+
+    async def connect(self):
+        self.session_id = self.scope['url_route']['kwargs']['session_id']
+        self.room_group_name = f'game_{self.session_id}'
+        self.user = self.scope['user']
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+
+    @rate_limited('chat_message')
+    async def handle_chat_message(self, data):
+        player = await self.legacy_get_player()
+        if not player:
+            return
+        await self.legacy_save_chat_message(player, data['message'])
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'chat_message',
+            'message': {
+                'player_number': player.player_number,
+                'nickname': player.user.nickname,
+                'message': data['message'],
+                'timestamp': timezone.now().isoformat()
+            }
+        })
+
+    @rate_limited('quiz_answer')
+    async def handle_quiz_answer(self, data):
+        player = await self.legacy_get_player()
+        if not player or not player.is_alive:
+            return
+        session = await self.get_session()
+        if session.status != 'quiz':
+            return
+        if await self.legacy_check_if_already_answered(player, data['question_id']):
+            return
+        is_correct = await self.legacy_save_quiz_answer(player, data['question_id'], data['answer'], data['time_taken'])
+        if is_correct is None:
+            return
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'quiz_answer_received',
+            'answer_data': {
+                'player_number': player.player_number,
+                'nickname': player.user.nickname,
+                'question_id': data['question_id'],
+                'answer': data['answer'],
+                'is_correct': is_correct,
+                'time_taken': data['time_taken']
+            }
+        })
+
+    @db_sync_to_async
+    def legacy_get_player(self):
+        try:
+            return Player.objects.select_related('user').get(session__session_id=self.session_id, user=self.user)
+        except Player.DoesNotExist:
+            return None
+
+    @db_sync_to_async
+    def legacy_save_chat_message(self, player, message):
+        return ChatMessage.objects.create(session=player.session, player=player, message=message)
+
+    @db_sync_to_async
+    def legacy_check_if_already_answered(self, player, question_id):
+        return QuizAnswer.objects.filter(player=player, question_id=question_id).exists()
+
+    @db_sync_to_async
+    def legacy_save_quiz_answer(self, player, question_id, answer, time_taken):
+        question = QuizQuestion.objects.get(id=question_id)
+        is_correct = question.correct_answer == answer
+        try:
+            with transaction.atomic():
+                QuizAnswer.objects.create(
+                    player=player, session=player.session, question=question,
+                    answer=answer, is_correct=is_correct, time_taken=time_taken
+                )
+        except IntegrityError:
+            return None
+        return is_correct
+
+def seed(clients, frames):
+    users = User.objects.bulk_create([
+        User(nickname=f'bench{i}', email=f'bench{i}@example.com') for i in range(clients)
+    ])
+    sessions = []
+    for user in users:
+        session = GameSession.objects.create(status='quiz')
+        Player.objects.create(user=user, session=session, player_number=1)
+        sessions.append(session)
+    questions = QuizQuestion.objects.bulk_create([
+        QuizQuestion(
+            question_text=f'Question {i}', option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A'
+        ) for i in range(frames)
+    ])
+    return list(zip(users, sessions)), [question.id for question in questions]
+
+async def client(consumer, user, session, question_ids, latencies, interval):
+    communicator = ApplicationCommunicator(consumer.as_asgi(), {
+        'type': 'websocket', 'path': f'/ws/game/{session.session_id}/', 'headers': [], 'subprotocols': [],
+        'user': user, 'url_route': {'kwargs': {'session_id': str(session.session_id)}}
+    })
+    await communicator.send_input({'type': 'websocket.connect'})
+    await communicator.receive_output(timeout=30)  # accept
+    if consumer is GameConsumer:
+        await communicator.receive_output(timeout=30)  # game_state
+
+    loop = asyncio.get_running_loop()
+    next_frame = loop.time()
+    for i, question_id in enumerate(question_ids):
+        # Frames arrive on a schedule, whether or not the last one is done
+        next_frame += interval
+        await asyncio.sleep(max(0, next_frame - loop.time()))
+        if i % 2:
+            frame = {'type': 'chat_message', 'message': f'hello {i}'}
+        else:
+            frame = {'type': 'quiz_answer', 'question_id': question_id, 'answer': 'A', 'time_taken': 1.0}
+        start = time.perf_counter()
+        await communicator.send_input({'type': 'websocket.receive', 'text': json_codec.dumps(frame)})
+        await communicator.receive_output(timeout=60)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+    await communicator.wait(timeout=5)
+
+async def sample_queue(depths, stop):
+    queue = get_db_executor()._work_queue
+    while not stop.is_set():
+        depths.append(queue.qsize())
+        await asyncio.sleep(0.001)
+
+async def run(consumer, players, question_ids, interval):
+    executor_stats.reset()
+    latencies = []
+    depths = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_queue(depths, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(client(consumer, user, session, question_ids, latencies, interval) for user, session in players))
+    wall = (time.perf_counter() - start) * 1000
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    return {
+        'wall': wall,
+        'p50': statistics.median(latencies),
+        'p99': latencies[max(int(len(latencies) * 0.99) - 1, 0)],
+        'queue_avg': statistics.mean(depths),
+        'queue_max': max(depths),
+        'calls_per_frame': executor_stats.as_dict()['checkouts'] / len(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=50, help='Concurrent sockets, one session each')
+    parser.add_argument('--frames', type=int, default=40, help='Frames per socket, alternating answer/chat')
+    parser.add_argument('--interval-ms', type=float, default=200, help='Time between a socket\'s frames')
+    parser.add_argument('--workers', type=int, default=8, help='DB_EXECUTOR_WORKERS')
+    args = parser.parse_args()
+    settings.DB_EXECUTOR_WORKERS = args.workers
+    settings.DB_POOL_SLOW_WAIT = float('inf')
+
+    call_command('migrate', verbosity=0)
+    players, question_ids = seed(args.clients, args.frames)
+
+    for name, consumer in [('one call per lookup', LegacyConsumer), ('one call per frame', GameConsumer)]:
+        QuizAnswer.objects.all().delete()
+        result = asyncio.run(run(consumer, players, question_ids, args.interval_ms / 1000))
+        print(
+            f"{name:<20} wall={result['wall']:.0f}ms p50={result['p50']:.1f}ms p99={result['p99']:.1f}ms "
+            f"calls/frame={result['calls_per_frame']:.2f} executor queue avg={result['queue_avg']:.1f} "
+            f"max={result['queue_max']}"
+        )
+
+if __name__ == '__main__':
+    main()
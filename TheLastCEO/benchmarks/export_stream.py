@@ -0,0 +1,77 @@
+"""
+Memory of a streaming export: seeds --rows quiz answers, then streams the
+answers export as CSV, JSONL and gzipped JSONL, reporting time and output
+size for each, then peak Python memory from a second, traced pass. Compare --rows 100000 with
+--rows 1000000: the peak should not grow with the row count.
+
+    DEBUG=False python benchmarks/export_stream.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from game.exports import export
+from game.models import GameSession, Player, QuizAnswer, QuizQuestion, User
+
+PLAYERS_PER_SESSION = 80
+
+def seed(rows):
+    questions = QuizQuestion.objects.bulk_create([
+        QuizQuestion(question_text=f'Q{i}', option_a='a', option_b='b', option_c='c', option_d='d', correct_answer='A')
+        for i in range(6)
+    ])
+    users = User.objects.bulk_create([
+        User(nickname=f'bench{i}', email=f'bench{i}@example.com') for i in range(PLAYERS_PER_SESSION)
+    ])
+    per_session = PLAYERS_PER_SESSION * len(questions)
+    now = timezone.now()
+    for _ in range((rows + per_session - 1) // per_session):
+        session = GameSession.objects.create(status='finished', finished_at=now)
+        players = Player.objects.bulk_create([
+            Player(user=user, session=session, player_number=number)
+            for number, user in enumerate(users, 1)
+        ])
+        QuizAnswer.objects.bulk_create([
+            QuizAnswer(player=player, session=session, question=question, answer='A', is_correct=True, time_taken=1.5)
+            for player in players for question in questions
+        ], batch_size=2000)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000, help='Quiz answers to seed, rounded up to whole sessions')
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous=OFF')
+    seed(args.rows)
+    print(f'{QuizAnswer.objects.count()} answers')
+
+    for fmt, gzip in [('csv', False), ('jsonl', False), ('jsonl', True)]:
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in export('answers', fmt, gzip=gzip))
+        elapsed = time.perf_counter() - start
+        # tracemalloc slows the export several times over, so it gets its own pass
+        tracemalloc.start()
+        for _ in export('answers', fmt, gzip=gzip):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        name = f"{fmt}{' gzip' if gzip else ''}"
+        print(f'{name:<11} {elapsed:.1f}s {size / 1e6:.1f}MB out, peak memory {peak / 1e6:.1f}MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+JSON encode/decode cost of WebSocket frames and REST responses: stdlib json
+(what GameConsumer and DRF's JSONRenderer used) against game.json_codec.
+
+The game_state frame mirrors send_game_state for a full 80 player session;
+the profile body mirrors UserProfileSerializer output.
+
+    python benchmarks/json_codec.py --players 80 --iterations 5000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django
+django.setup()
+
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from game import json_codec
+
+def game_state(players):
+    return {
+        'type': 'game_state',
+        'data': {
+            'session_id': str(uuid.uuid4()),
+            'status': 'red_light',
+            'current_stage': 2,
+            'prize_pool': 16000000.0,
+            'players': [{
+                'player_number': number,
+                'nickname': f'player{number}',
+                'avatar_color': 'purple',
+                'is_alive': number % 3 != 0,
+                'position_x': number * 1.5,
+                'position_y': 100.25
+            } for number in range(1, players + 1)],
+            'avatar_atlas': {
+                'url': 'https://storage.googleapis.com/bucket/atlases/abc.png',
+                'tile_size': 32,
+                'columns': 10,
+                'tiles': {str(number): [(number - 1) % 10 * 32, (number - 1) // 10 * 32] for number in range(1, players + 1)}
+            },
+            'timestamp': timezone.now().isoformat()
+        }
+    }
+
+def profile():
+    now = timezone.now()
+    return {
+        'id': 42, 'nickname': 'player42', 'balance': Decimal('185000.00'),
+        'avatar_url': 'https://storage.googleapis.com/bucket/avatars/abc.png',
+        'avatar_headwear': 'crown', 'avatar_accessory': 'glasses', 'avatar_gender': 'female',
+        'avatar_favorite_color': 'pink', 'avatar_generation_in_progress': False,
+        'total_games_played': 12, 'total_games_won': 2, 'total_earnings': Decimal('3200000.00'),
+        'created_at': now
+    }
+
+def bench(label, func, iterations):
+    seconds = min(timeit.repeat(func, number=iterations, repeat=5))
+    print(f"{label:<34} {seconds / iterations * 1e6:8.2f}us")
+    return seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=80)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print(f"orjson: {'yes' if json_codec.orjson else 'no (stdlib fallback)'}")
+    frame = game_state(args.players)
+    text = json.dumps(frame)
+    print(f"game_state frame: {len(text)} bytes")
+    old = bench('send   json.dumps', lambda: json.dumps(frame), n)
+    new = bench('send   json_codec.dumps', lambda: json_codec.dumps(frame), n)
+    print(f"{'':<34} {old / new:8.1f}x")
+    old = bench('receive json.loads', lambda: json.loads(text), n)
+    new = bench('receive json_codec.loads', lambda: json_codec.loads(text), n)
+    print(f"{'':<34} {old / new:8.1f}x")
+
+    body = profile()
+    old = bench('profile JSONRenderer', lambda: JSONRenderer().render(body), n)
+    new = bench('profile FastJSONRenderer', lambda: json_codec.FastJSONRenderer().render(body), n)
+    print(f"{'':<34} {old / new:8.1f}x")
+
+if __name__ == '__main__':
+    main()
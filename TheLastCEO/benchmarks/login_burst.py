@@ -0,0 +1,99 @@
+"""
+WebSocket latency during a login burst.
+
+Runs an echo consumer whose handler does one database_sync_to_async call per
+frame (like GameConsumer.get_player) and measures round-trip latency while a
+burst of logins is in flight, first through the old synchronous path
+(authenticate() on the thread-sensitive executor) and then through the async
+login_view backed by the hashing pool.
+
+    python benchmarks/login_burst.py --logins 100 --pings 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+import django
+django.setup()
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import authenticate
+from django.core.management import call_command
+from django.test import AsyncRequestFactory
+from game.models import User
+from game.views import login_view
+
+PASSWORD = 'benchpass123'
+
+class EchoConsumer(AsyncWebsocketConsumer):
+    channel_layer_alias = 'unused'  # no groups needed, skip Redis
+    async def receive(self, text_data=None, bytes_data=None):
+        await self.touch_db()
+        await self.send(text_data=text_data)
+
+    @database_sync_to_async
+    def touch_db(self):
+        return User.objects.filter(nickname='bench').exists()
+
+async def sync_login():
+    await sync_to_async(authenticate)(username='bench', password=PASSWORD)
+
+async def async_login(factory):
+    request = factory.post('/auth/login/', {'nickname': 'bench', 'password': PASSWORD}, content_type='application/json')
+    await login_view(request)
+
+async def measure(login, logins, pings):
+    # channels.testing needs daphne, so drive the ASGI messages directly
+    communicator = ApplicationCommunicator(EchoConsumer.as_asgi(), {
+        'type': 'websocket', 'path': '/ws/echo/', 'headers': [], 'subprotocols': []
+    })
+    await communicator.send_input({'type': 'websocket.connect'})
+    await communicator.receive_output(timeout=5)
+
+    burst = asyncio.gather(*(login() for _ in range(logins)), return_exceptions=True)
+    latencies = []
+    for _ in range(pings):
+        start = time.perf_counter()
+        await communicator.send_input({'type': 'websocket.receive', 'text': 'ping'})
+        await communicator.receive_output(timeout=60)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+    await burst
+    await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+    await communicator.wait(timeout=5)
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'max': latencies[-1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--pings', type=int, default=200)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    User.objects.create_user(nickname='bench', email='bench@example.com', password=PASSWORD)
+    factory = AsyncRequestFactory()
+
+    for name, login in [('idle', None), ('sync authenticate', sync_login), ('async login_view', lambda: async_login(factory))]:
+        logins = args.logins if login else 0
+        result = asyncio.run(measure(login or sync_login, logins, args.pings))
+        print(f"{name:<20} p50={result['p50']:.1f}ms p99={result['p99']:.1f}ms max={result['max']:.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Question bank import: writes a CSV or JSONL file of --questions rows, imports
+it with import_questions, then imports it again (all updates), reporting the
+time of each pass, plus the peak Python memory of a third, traced pass (run
+with DEBUG=False, or the query log holds every batch).
+
+    python benchmarks/question_import.py --questions 100000 --format jsonl
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from game import json_codec
+from game.question_bank import import_questions, read_rows
+
+FIELDS = ['external_id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer', 'difficulty', 'category']
+
+def rows(count):
+    for i in range(count):
+        yield {
+            'external_id': f'bench-{i}',
+            'question_text': f'Benchmark question number {i}?',
+            'option_a': f'Answer {i} A', 'option_b': f'Answer {i} B',
+            'option_c': f'Answer {i} C', 'option_d': f'Answer {i} D',
+            'correct_answer': 'ABCD'[i % 4],
+            'difficulty': i % 5 + 1,
+            'category': f'category-{i % 20}',
+        }
+
+def write(path, fmt, count):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows(count))
+        else:
+            for row in rows(count):
+                f.write(json_codec.dumps(row) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    path = os.path.join(tempfile.mkdtemp(), f'bank.{args.format}')
+    write(path, args.format, args.questions)
+    print(f'{args.questions} questions, {os.path.getsize(path) / 1e6:.1f}MB {args.format}')
+
+    for name in ('first import', 're-import'):
+        start = time.perf_counter()
+        counts = import_questions(read_rows(path), batch_size=args.batch_size)
+        print(f"{name:<13} {time.perf_counter() - start:.2f}s created={counts['created']} updated={counts['updated']}")
+
+    # tracemalloc slows the import several times over, so it gets its own pass
+    tracemalloc.start()
+    import_questions(read_rows(path), batch_size=args.batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'peak memory   {peak / 1e6:.1f}MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Worker boot cost: django.setup() plus importing the URLconf (which pulls in
+game.views and everything it imports), measured in fresh interpreters.
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --project-dir /path/to/other/checkout
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+import django
+django.setup()
+setup_done = time.perf_counter()
+import config.urls
+end = time.perf_counter()
+heavy = [name for name in ('vertexai', 'google.cloud.storage') if name in sys.modules]
+print(f"{(setup_done - start) * 1000:.1f} {(end - setup_done) * 1000:.1f} {','.join(heavy) or '-'}")
+"""
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--project-dir', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+    setup_times, url_times = [], []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=args.project_dir, env=env,
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        setup_times.append(float(output[0]))
+        url_times.append(float(output[1]))
+        heavy = output[2]
+
+    print(f"django.setup()     median {statistics.median(setup_times):.1f}ms")
+    print(f"import config.urls median {statistics.median(url_times):.1f}ms")
+    print(f"total              median {statistics.median(a + b for a, b in zip(setup_times, url_times)):.1f}ms")
+    print(f"heavy SDKs loaded: {heavy}")
+
+if __name__ == '__main__':
+    main()
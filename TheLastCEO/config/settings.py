@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'game.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -78,9 +79,10 @@ ASGI_APPLICATION = 'config.asgi.application'
 
 # Use DATABASE_URL if provided, otherwise use individual settings
 DATABASE_URL = os.getenv('DATABASE_URL')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 600))  # seconds, without pooling
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True)
     }
 else:
     DATABASES = {
@@ -91,6 +93,8 @@ else:
             'PASSWORD': os.getenv('DB_PASSWORD', '123123123qwe!'),
             'HOST': os.getenv('DB_HOST', 'db.hpovgribnyikmxgbxtww.supabase.co'),
             'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
             'OPTIONS': {
                 'connect_timeout': 10,
                 'sslmode': 'require',
@@ -98,6 +102,40 @@ else:
         }
     }
 
+# Optional read replica for explicitly read-only views and queries
+# (game.db_router). Tests mirror it onto the primary.
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_REPLICA = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['game.db_router.ReplicaRouter']
+
+# Threads running the consumers' db_sync_to_async calls (game.db_pool); each
+# holds at most one connection while a call runs
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 8))
+DB_POOL_SLOW_WAIT = float(os.getenv('DB_POOL_SLOW_WAIT', 0.2))  # seconds, logged as a warning
+
+# Pooled PostgreSQL connections shared by all threads of a worker process.
+# Size the pool for the DB executor plus the threads serving sync HTTP views.
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'False').lower() == 'true'
+if DB_POOL_ENABLED:
+    for database in DATABASES.values():
+        if database['ENGINE'] != 'django.db.backends.postgresql':
+            continue
+        database.update({
+            'ENGINE': 'game.backends.postgresql_pool',
+            # Closing hands the connection back to the pool
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', DB_EXECUTOR_WORKERS + 4)),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),  # seconds waiting for a free connection
+                'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 30)),  # idle seconds before a ping on reuse
+            },
+        })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -147,11 +185,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'game.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed, stdlib otherwise (game.json_codec)
+    'DEFAULT_RENDERER_CLASSES': [
+        'game.json_codec.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'game.json_codec.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -167,10 +215,44 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Password hashing pool used by the async register/login views
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 64))  # beyond this we answer 429
+
+# JWT auth (WebSocket and REST): resolved users are cached so connect storms skip the DB
+WS_AUTH_USER_CACHE_TIMEOUT = int(os.getenv('WS_AUTH_USER_CACHE_TIMEOUT', 300))  # seconds
+
 # Redis Configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
 REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5))  # seconds
+
+# Shared cache. Without REDIS_URL in the environment (local runs, tests) it
+# falls back to a per-process memory cache.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if 'REDIS_URL' in os.environ else 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'thelastceo',
+            'OPTIONS': {
+                'socket_connect_timeout': REDIS_SOCKET_TIMEOUT,
+                'socket_timeout': REDIS_SOCKET_TIMEOUT,
+            },
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Process-local tier in front of the shared cache (game.caching)
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', 1000))
+LOCAL_CACHE_TIMEOUT = float(os.getenv('LOCAL_CACHE_TIMEOUT', 5))  # seconds
 
 CHANNEL_LAYERS = {
     'default': {
@@ -181,8 +263,30 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Celery (background avatar generation)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_IGNORE_RESULT = True
+# Run tasks in-process, for local development and tests without a worker
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+
 AUTH_USER_MODEL = 'game.User'
 
+# Token bucket rate limits for REST throttles and WebSocket frames.
+# 'redis' shares per-user buckets across workers, 'local' keeps them in-process.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'redis')
+RATE_LIMITS = {
+    'chat_message': {'rate': '2/s', 'burst': 5},
+    'player_movement': {'rate': '20/s', 'burst': 40},
+    'quiz_answer': {'rate': '2/s', 'burst': 4},
+    'join_game': {'rate': '10/m', 'burst': 5},
+    'customize_avatar': {'rate': '6/m', 'burst': 3},
+}
+
+# Finished sessions' answers, chat and movements are compressed into
+# SessionArchive rows (manage.py archive_sessions) to keep the live tables small
+SESSION_ARCHIVE_AFTER_HOURS = int(os.getenv('SESSION_ARCHIVE_AFTER_HOURS', 24))
+SESSION_ARCHIVE_DELETE_BATCH_SIZE = int(os.getenv('SESSION_ARCHIVE_DELETE_BATCH_SIZE', 1000))
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
 
@@ -194,3 +298,14 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', os.
 # Avatar generation settings
 AVATAR_GENERATION_ENABLED = os.getenv('AVATAR_GENERATION_ENABLED', 'True').lower() == 'true'
 AVATAR_CACHE_TIMEOUT = int(os.getenv('AVATAR_CACHE_TIMEOUT', 3600))  # 1 hour in seconds
+AVATAR_GENERATOR_BACKEND = os.getenv('AVATAR_GENERATOR_BACKEND', 'game.avatar_service.ImagenAvatarGenerator')
+# game.avatar_storage.GCSAvatarStorage, LocalAvatarStorage (MEDIA_ROOT behind nginx) or InMemoryAvatarStorage
+AVATAR_STORAGE_BACKEND = os.getenv('AVATAR_STORAGE_BACKEND', 'game.avatar_storage.GCSAvatarStorage')
+# Public prefix for local/in-memory avatars, e.g. https://example.com/media/
+AVATAR_PUBLIC_BASE_URL = os.getenv('AVATAR_PUBLIC_BASE_URL', MEDIA_URL)
+# Concurrent prompts within the window are sent to the generator as one batch
+AVATAR_GENERATION_BATCH_WINDOW = float(os.getenv('AVATAR_GENERATION_BATCH_WINDOW', 0.05))  # seconds
+AVATAR_GENERATION_BATCH_SIZE = int(os.getenv('AVATAR_GENERATION_BATCH_SIZE', 8))
+AVATAR_STORAGE_UPLOAD_WORKERS = int(os.getenv('AVATAR_STORAGE_UPLOAD_WORKERS', 4))
+AVATAR_FETCH_TIMEOUT = float(os.getenv('AVATAR_FETCH_TIMEOUT', 5))  # seconds, remote avatars for atlases
+AVATAR_ATLAS_CACHE_TIMEOUT = int(os.getenv('AVATAR_ATLAS_CACHE_TIMEOUT', 6 * 3600))
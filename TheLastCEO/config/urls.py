@@ -31,9 +31,14 @@ api_urlpatterns = [
     path('games/available/', views.available_games, name='available_games'),
     path('games/create/', views.create_game, name='create_game'),
     path('games/<uuid:session_id>/join/', views.join_game, name='join_game'),
+    path('games/<uuid:session_id>/events/', views.game_events, name='game_events'),
+    path('games/history/', views.game_history, name='game_history'),
     path('avatar/options/', views.avatar_options, name='avatar_options'),
     path('avatar/customize/', views.customize_avatar, name='customize_avatar'),
     path('quiz/questions/', views.quiz_questions, name='quiz_questions'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/me/', views.leaderboard_rank, name='leaderboard_rank'),
+    path('exports/<slug:dataset>.<slug:fmt>', views.export_data, name='export_data'),
 ]
 
 urlpatterns = [
@@ -1,13 +1,30 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, GameSession, Player, QuizQuestion, QuizAnswer, RedLightMovement, ChatMessage, GameStatistics
+from .db_router import read_only
+from .models import User, GameSession, Player, QuizQuestion, QuizAnswer, RedLightMovement, ChatMessage, GameStatistics, BalanceTransaction
+
+class ReplicaChangeListMixin:
+    """Serve list pages (counts, filters, rows) from the read replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            # Bulk actions write
+            return super().changelist_view(request, extra_context)
+        with read_only():
+            response = super().changelist_view(request, extra_context)
+            # The rows are only queried while the template renders
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ReplicaChangeListMixin, UserAdmin):
     list_display = ('nickname', 'email', 'balance', 'total_games_played', 'total_games_won', 'total_earnings', 'is_active', 'created_at')
     list_filter = ('is_active', 'avatar_gender', 'avatar_favorite_color', 'created_at')
     search_fields = ('nickname', 'email')
     ordering = ('-created_at',)
+    # Balances change through BalanceTransaction rows only
+    readonly_fields = ('balance', 'total_earnings', 'total_games_won')
     
     fieldsets = (
         (None, {'fields': ('nickname', 'password')}),
@@ -26,44 +43,53 @@ class CustomUserAdmin(UserAdmin):
     )
 
 @admin.register(GameSession)
-class GameSessionAdmin(admin.ModelAdmin):
+class GameSessionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('session_id', 'status', 'max_players', 'entry_fee', 'prize_pool', 'current_stage', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('session_id',)
-    readonly_fields = ('session_id', 'created_at', 'started_at', 'finished_at')
+    # Counters are kept by F() updates and skipped by full saves; fix count drift with
+    # manage.py reconcile_session_counters
+    readonly_fields = ('session_id', 'created_at', 'started_at', 'finished_at', 'player_count', 'alive_count', 'prize_pool')
 
 @admin.register(Player)
-class PlayerAdmin(admin.ModelAdmin):
+class PlayerAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('player_number', 'user', 'session', 'is_alive', 'elimination_stage', 'final_prize', 'joined_at')
     list_filter = ('is_alive', 'elimination_stage', 'joined_at')
     search_fields = ('user__nickname', 'session__session_id')
 
 @admin.register(QuizQuestion)
-class QuizQuestionAdmin(admin.ModelAdmin):
-    list_display = ('question_text', 'correct_answer', 'difficulty', 'category', 'is_active')
+class QuizQuestionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('question_text', 'external_id', 'correct_answer', 'difficulty', 'category', 'is_active')
     list_filter = ('difficulty', 'category', 'is_active')
-    search_fields = ('question_text',)
+    search_fields = ('question_text', 'external_id')
 
 @admin.register(QuizAnswer)
-class QuizAnswerAdmin(admin.ModelAdmin):
+class QuizAnswerAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('player', 'question', 'answer', 'is_correct', 'time_taken', 'answered_at')
     list_filter = ('is_correct', 'answered_at')
     search_fields = ('player__user__nickname', 'question__question_text')
 
 @admin.register(RedLightMovement)
-class RedLightMovementAdmin(admin.ModelAdmin):
+class RedLightMovementAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('player', 'session', 'from_x', 'from_y', 'to_x', 'to_y', 'is_during_red_light', 'eliminated', 'timestamp')
     list_filter = ('is_during_red_light', 'eliminated', 'timestamp')
     search_fields = ('player__user__nickname', 'session__session_id')
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('player', 'session', 'message', 'is_system_message', 'timestamp')
     list_filter = ('is_system_message', 'timestamp')
     search_fields = ('player__user__nickname', 'message')
 
 @admin.register(GameStatistics)
-class GameStatisticsAdmin(admin.ModelAdmin):
+class GameStatisticsAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('id', 'session', 'total_players', 'quiz_eliminations', 'red_light_eliminations', 'winners_count', 'total_prize_distributed', 'average_survival_time', 'created_at')
     list_filter = ('created_at',)
     readonly_fields = ('created_at',)
+
+@admin.register(BalanceTransaction)
+class BalanceTransactionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'amount', 'session', 'idempotency_key', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__nickname', 'idempotency_key')
+    readonly_fields = ('created_at',)
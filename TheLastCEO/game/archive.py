@@ -0,0 +1,146 @@
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from . import json_codec
+from .models import GameSession, QuizAnswer, ChatMessage, RedLightMovement, SessionArchive
+from .statistics import update_statistics
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+# Archived tables and the columns kept for each (plus the player's number);
+# rows are written in id order as JSONL lines tagged with their table
+ARCHIVED_TABLES = {
+    'quiz_answers': (QuizAnswer, (
+        'id', 'question_id', 'answer', 'is_correct', 'answered_at', 'time_taken',
+    )),
+    'chat_messages': (ChatMessage, (
+        'id', 'message', 'timestamp', 'is_system_message',
+    )),
+    'movements': (RedLightMovement, (
+        'id', 'from_x', 'from_y', 'to_x', 'to_y', 'timestamp', 'is_during_red_light', 'eliminated',
+    )),
+}
+
+COUNT_FIELDS = {
+    'quiz_answers': 'quiz_answer_count',
+    'chat_messages': 'chat_message_count',
+    'movements': 'movement_count',
+}
+
+def _compressor():
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compressobj()
+    return 'zlib', zlib.compressobj(9)
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Archive is zstd compressed but zstandard is not installed')
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data)
+
+def _live_rows(session, table):
+    model, columns = ARCHIVED_TABLES[table]
+    return model.objects.filter(session=session).order_by('id').values(
+        *columns, player_number=F('player__player_number')
+    )
+
+def archive_session(session: GameSession) -> SessionArchive:
+    """
+    Compress a finished session's child rows into its SessionArchive, record
+    its GameStatistics, then delete the originals in batches. Safe to rerun:
+    an existing archive is kept and only leftover rows are deleted.
+    """
+    if session.status != 'finished':
+        raise ValueError(f'Session {session.session_id} is not finished')
+
+    archive = SessionArchive.objects.filter(session=session).first()
+    if archive is None:
+        codec, compressor = _compressor()
+        chunks = []
+        raw_size = 0
+        counts = {}
+        for table in ARCHIVED_TABLES:
+            counts[table] = 0
+            for row in _live_rows(session, table).iterator(chunk_size=CHUNK_SIZE):
+                row['table'] = table
+                line = json_codec.dumps_bytes(row) + b'\n'
+                raw_size += len(line)
+                counts[table] += 1
+                chunks.append(compressor.compress(line))
+        chunks.append(compressor.flush())
+
+        with transaction.atomic():
+            update_statistics(session)
+            archive = SessionArchive.objects.create(
+                session=session,
+                codec=codec,
+                data=b''.join(chunks),
+                raw_size=raw_size,
+                **{COUNT_FIELDS[table]: count for table, count in counts.items()}
+            )
+
+    # The archive is committed before anything is deleted, so an interrupted
+    # run loses nothing
+    batch_size = settings.SESSION_ARCHIVE_DELETE_BATCH_SIZE
+    for model, _ in ARCHIVED_TABLES.values():
+        while True:
+            ids = list(model.objects.filter(session=session).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(id__in=ids).delete()
+    return archive
+
+def archive_finished_sessions(older_than=None, limit=None):
+    """Archive sessions finished more than `older_than` ago, returning how many were archived"""
+    older_than = older_than if older_than is not None else timedelta(hours=settings.SESSION_ARCHIVE_AFTER_HOURS)
+    # Also picks up archived sessions whose deletes were interrupted
+    pending = Q(archive__isnull=True)
+    for model, _ in ARCHIVED_TABLES.values():
+        pending |= Exists(model.objects.filter(session=OuterRef('pk')))
+    sessions = GameSession.objects.filter(
+        pending,
+        status='finished',
+        finished_at__lt=timezone.now() - older_than
+    ).order_by('finished_at')
+    if limit:
+        sessions = sessions[:limit]
+
+    archived = 0
+    for session in sessions:
+        try:
+            archive_session(session)
+            archived += 1
+        except Exception as e:
+            logger.error(f"Error archiving session {session.session_id}: {str(e)}")
+    return archived
+
+def read_archive(archive: SessionArchive) -> dict:
+    """Rows of an archive grouped by table"""
+    events = {table: [] for table in ARCHIVED_TABLES}
+    for line in _decompress(archive.codec, bytes(archive.data)).splitlines():
+        row = json_codec.loads(line)
+        events[row.pop('table')].append(row)
+    return events
+
+def session_events(session: GameSession) -> dict:
+    """
+    A session's answers, chat and movements grouped by table, read from its
+    archive once it has one. Archived timestamps come back as the ISO strings
+    the API renders live ones as.
+    """
+    archive = SessionArchive.objects.filter(session=session).first()
+    if archive is not None:
+        return {'archived': True, **read_archive(archive)}
+    return {'archived': False, **{table: list(_live_rows(session, table)) for table in ARCHIVED_TABLES}}
@@ -1,48 +1,91 @@
-import os
+import hashlib
 import logging
-from typing import Optional, Tuple
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import zip_longest
+from typing import List, Optional, Tuple
 from io import BytesIO
 from PIL import Image
-from google.cloud import storage
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from .avatar_storage import configure_google_credentials, get_avatar_storage
 import base64
-import vertexai
-from vertexai.preview.vision_models import ImageGenerationModel
 
 logger = logging.getLogger(__name__)
 
-class AvatarGenerationService:
-    """Service for generating avatars using Google Cloud Imagen 4"""
+# Bump when generate_avatar_prompt changes so old images are not reused
+AVATAR_PROMPT_VERSION = 1
+
+def avatar_attributes_key(headwear: str, accessory: str, gender: str, favorite_color: str) -> str:
+    """Content address of the avatar for an attribute tuple"""
+    raw = f"v{AVATAR_PROMPT_VERSION}|{headwear}|{accessory}|{gender}|{favorite_color}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def avatar_blob_path(avatar_key: str) -> str:
+    return f"avatars/{avatar_key}.png"
+
+def avatar_url_cache_key(avatar_key: str) -> str:
+    return f"avatar_url:{avatar_key}"
+
+class AvatarGenerator(ABC):
+    """
+    Turns prompts into 32x32 avatar PNGs.
+
+    Backends implement generate_image; generate_images receives a batch of
+    distinct prompts from AvatarRequestCoalescer and returns one result (or
+    None on failure) per prompt, in order.
+    """
+    
+    @abstractmethod
+    def generate_image(self, prompt: str) -> Optional[bytes]:
+        ...
+    
+    def generate_images(self, prompts: List[str]) -> List[Optional[bytes]]:
+        return [self.generate_image(prompt) for prompt in prompts]
+
+class ImagenAvatarGenerator(AvatarGenerator):
+    """Generates avatar PNGs with Google Cloud Imagen 4"""
+    
+    MODEL_NAME = "imagen-4.0-generate-preview-06-06"
     
     def __init__(self):
-        # Use environment variables from settings
-        credentials_path = settings.GOOGLE_APPLICATION_CREDENTIALS
-        project_id = settings.GOOGLE_CLOUD_PROJECT_ID
-        bucket_name = settings.GOOGLE_CLOUD_BUCKET_NAME
-        
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
+        # The Vertex AI SDK takes seconds to import, so only load it here
+        import vertexai
+        configure_google_credentials()
         vertexai.init(
-            project=project_id,
+            project=settings.GOOGLE_CLOUD_PROJECT_ID,
             location='us-central1'
         )
-        self.storage_client = storage.Client(project=project_id)
-        self.bucket = self.storage_client.bucket(bucket_name)
-    
-    def generate_avatar_prompt(self, headwear: str, accessory: str, gender: str, favorite_color: str) -> str:
-        """Generate the prompt for avatar creation"""
-        gender_description = "male" if gender == "male" else "female"
-        return (
-            f"A pixel art style square avatar head, only the head, centered and filling the entire 32x32px image, "
-            f"with a {favorite_color} background color, no body, no shoulders, no other background elements. "
-            f"The head should be fullscreen and fill the canvas. "
-            f"Create a {gender_description} character wearing a {headwear} and {accessory}."
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.AVATAR_GENERATION_BATCH_SIZE,
+            thread_name_prefix='avatar-imagen'
         )
     
-    def generate_avatar_image(self, prompt: str) -> Optional[bytes]:
+    @property
+    def model(self):
+        # One handle per process instead of a from_pretrained() lookup per image
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from vertexai.preview.vision_models import ImageGenerationModel
+                    self._model = ImageGenerationModel.from_pretrained(self.MODEL_NAME)
+        return self._model
+    
+    def generate_images(self, prompts: List[str]) -> List[Optional[bytes]]:
+        # Imagen takes a single prompt per call (number_of_images only adds
+        # variants of it), so a batch is issued concurrently on the shared handle
+        if len(prompts) == 1:
+            return [self.generate_image(prompts[0])]
+        return list(self._executor.map(self.generate_image, prompts))
+    
+    def generate_image(self, prompt: str) -> Optional[bytes]:
         """Generate avatar image using Google Cloud Imagen 4"""
         try:
-            model = ImageGenerationModel.from_pretrained("imagen-4.0-generate-preview-06-06")
-            response = model.generate_images(
+            response = self.model.generate_images(
                 prompt=prompt,
                 number_of_images=1
             )
@@ -78,37 +121,177 @@ class AvatarGenerationService:
             logger.error(f"Error generating avatar image: {str(e)}")
             return None
     
-    def upload_to_cloud_storage(self, image_bytes: bytes, user_id: int) -> Optional[str]:
-        """Upload avatar image to Google Cloud Storage"""
+class FakeAvatarGenerator(AvatarGenerator):
+    """Offline generator producing a flat PNG derived from the prompt, for tests and dry runs"""
+    
+    def generate_image(self, prompt: str) -> Optional[bytes]:
+        digest = hashlib.sha256(prompt.encode()).digest()
+        pil_img = Image.new('RGBA', (32, 32), (digest[0], digest[1], digest[2], 255))
+        output = BytesIO()
+        pil_img.save(output, format='PNG', optimize=True)
+        return output.getvalue()
+
+class AvatarRequestCoalescer:
+    """
+    Single-flight and micro-batching in front of an AvatarGenerator.
+
+    A caller asking for a prompt that is already queued or generating waits
+    for that result instead of starting another call. The first caller of a
+    batch waits up to `window` seconds (less if `max_batch` prompts arrive)
+    for other prompts and then hands them all to the generator at once.
+    Failed generations are not remembered, so the next caller retries.
+    """
+    
+    def __init__(self, generator: AvatarGenerator, window: float = 0.05, max_batch: int = 8):
+        self.generator = generator
+        self.window = window
+        self.max_batch = max_batch
+        self.condition = threading.Condition()
+        self.in_flight = {}  # prompt -> Future
+        self.pending = []
+        self.collecting = False
+    
+    def generate(self, prompt: str) -> Optional[bytes]:
+        with self.condition:
+            future = self.in_flight.get(prompt)
+            leader = False
+            if future is None:
+                future = Future()
+                self.in_flight[prompt] = future
+                self.pending.append(prompt)
+                if len(self.pending) >= self.max_batch:
+                    self.condition.notify_all()
+                if not self.collecting:
+                    self.collecting = leader = True
+        if leader:
+            self._run_batch()
+        return future.result()
+    
+    def _run_batch(self):
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.pending) >= self.max_batch, timeout=self.window)
+            batch, self.pending = self.pending, []
+            self.collecting = False
+        results = [None] * len(batch)
         try:
-            blob_path = f"avatars/{user_id}.png"
-            blob = self.bucket.blob(blob_path)
-            blob.upload_from_string(
-                image_bytes,
-                content_type='image/png'
-            )
-            # Do not call blob.make_public()! Uniform bucket-level access is enabled.
-            # To make the file public, set bucket permissions via IAM in the GCP Console.
-            return f"https://storage.googleapis.com/{self.bucket.name}/{blob.name}"
+            results = self.generator.generate_images(batch)
+        except Exception as e:
+            logger.error(f"Error generating avatar batch: {str(e)}")
+        finally:
+            with self.condition:
+                for prompt, image_bytes in zip_longest(batch, results[:len(batch)]):
+                    self.in_flight.pop(prompt).set_result(image_bytes)
+
+class AvatarGenerationService:
+    """Generates avatars with the configured generator and keeps them in avatar storage"""
+    
+    def __init__(self, generator=None):
+        # The generator backend is created on first use so importing this module stays cheap
+        self._generator = generator
+        self._coalescer = None
+        self._lock = threading.Lock()
+    
+    @property
+    def generator(self):
+        if self._generator is None:
+            with self._lock:
+                if self._generator is None:
+                    self._generator = import_string(settings.AVATAR_GENERATOR_BACKEND)()
+        return self._generator
+    
+    @property
+    def coalescer(self):
+        if self._coalescer is None:
+            generator = self.generator
+            with self._lock:
+                if self._coalescer is None:
+                    self._coalescer = AvatarRequestCoalescer(
+                        generator,
+                        window=settings.AVATAR_GENERATION_BATCH_WINDOW,
+                        max_batch=settings.AVATAR_GENERATION_BATCH_SIZE
+                    )
+        return self._coalescer
+    
+    @property
+    def storage(self):
+        return get_avatar_storage()
+    
+    def generate_avatar_prompt(self, headwear: str, accessory: str, gender: str, favorite_color: str) -> str:
+        """Generate the prompt for avatar creation"""
+        gender_description = "male" if gender == "male" else "female"
+        return (
+            f"A pixel art style square avatar head, only the head, centered and filling the entire 32x32px image, "
+            f"with a {favorite_color} background color, no body, no shoulders, no other background elements. "
+            f"The head should be fullscreen and fill the canvas. "
+            f"Create a {gender_description} character wearing a {headwear} and {accessory}."
+        )
+    
+    def generate_avatar_image(self, prompt: str) -> Optional[bytes]:
+        return self.coalescer.generate(prompt)
+    
+    def upload_avatar(self, image_bytes: bytes, path: str) -> Optional[str]:
+        """Upload avatar image to the configured avatar storage"""
+        try:
+            return self.storage.save(path, image_bytes)
         except Exception as e:
-            logger.error(f"Error uploading avatar to Cloud Storage: {str(e)}")
+            logger.error(f"Error uploading avatar to storage: {str(e)}")
             return None
     
+    def get_cached_avatar_url(self, avatar_key: str) -> Optional[str]:
+        """URL of an already generated avatar, checking the cache before storage"""
+        avatar_url = cache.get(avatar_url_cache_key(avatar_key))
+        if avatar_url:
+            return avatar_url
+        path = avatar_blob_path(avatar_key)
+        try:
+            if not self.storage.exists(path):
+                return None
+        except Exception as e:
+            logger.error(f"Error checking avatar in storage: {str(e)}")
+            return None
+        avatar_url = self.storage.url(path)
+        cache.set(avatar_url_cache_key(avatar_key), avatar_url, settings.AVATAR_CACHE_TIMEOUT)
+        return avatar_url
+    
+    def ensure_avatar(self, headwear: str, accessory: str, gender: str, favorite_color: str) -> Optional[str]:
+        """URL of the avatar for these attributes, generating and uploading it if missing"""
+        # Avatars only depend on the attribute tuple, so identical
+        # customizations share one stored image
+        avatar_key = avatar_attributes_key(headwear, accessory, gender, favorite_color)
+        avatar_url = self.get_cached_avatar_url(avatar_key)
+        if avatar_url:
+            return avatar_url
+        prompt = self.generate_avatar_prompt(headwear, accessory, gender, favorite_color)
+        logger.info(f"Generating avatar {avatar_key} with prompt: {prompt}")
+        image_bytes = self.generate_avatar_image(prompt)
+        if not image_bytes:
+            return None
+        avatar_url = self.upload_avatar(image_bytes, avatar_blob_path(avatar_key))
+        if not avatar_url:
+            return None
+        cache.set(avatar_url_cache_key(avatar_key), avatar_url, settings.AVATAR_CACHE_TIMEOUT)
+        return avatar_url
+    
     def generate_and_upload_avatar(self, user_id: int, headwear: str, accessory: str, gender: str, favorite_color: str) -> Tuple[bool, Optional[str]]:
         try:
-            prompt = self.generate_avatar_prompt(headwear, accessory, gender, favorite_color)
-            logger.info(f"Generating avatar for user {user_id} with prompt: {prompt}")
-            image_bytes = self.generate_avatar_image(prompt)
-            if not image_bytes:
-                return False, None
-            avatar_url = self.upload_to_cloud_storage(image_bytes, user_id)
+            avatar_url = self.ensure_avatar(headwear, accessory, gender, favorite_color)
             if not avatar_url:
                 return False, None
-            logger.info(f"Avatar generated successfully for user {user_id}: {avatar_url}")
+            logger.info(f"Avatar ready for user {user_id}: {avatar_url}")
             return True, avatar_url
         except Exception as e:
             logger.error(f"Error in avatar generation process: {str(e)}")
             return False, None
 
-# Singleton instance
-avatar_service = AvatarGenerationService() 
\ No newline at end of file
+_avatar_service = None
+_avatar_service_lock = threading.Lock()
+
+def get_avatar_service() -> AvatarGenerationService:
+    """Process-wide service instance, built on first use"""
+    global _avatar_service
+    if _avatar_service is None:
+        with _avatar_service_lock:
+            if _avatar_service is None:
+                _avatar_service = AvatarGenerationService()
+    return _avatar_service
+ 
\ No newline at end of file
@@ -0,0 +1,188 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+import logging
+
+logger = logging.getLogger(__name__)
+
+def configure_google_credentials():
+    # Google SDKs read the key file location from the environment
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = settings.GOOGLE_APPLICATION_CREDENTIALS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _upload_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.AVATAR_STORAGE_UPLOAD_WORKERS,
+                    thread_name_prefix='avatar-upload'
+                )
+    return _executor
+
+class AvatarStorage(ABC):
+    """
+    Where generated avatars (and sprite atlases) live.
+
+    Paths are relative, e.g. ``avatars/<key>.png``. Subclasses implement
+    exists/save/open/url; the async and batch helpers run on a shared pool
+    so request and job threads do not wait on slow uploads.
+    """
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        ...
+
+    @abstractmethod
+    def save(self, path: str, data: bytes, content_type: str = 'image/png') -> str:
+        """Store `data` at `path` (overwriting) and return its public URL"""
+
+    @abstractmethod
+    def open(self, path: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def url(self, path: str) -> str:
+        ...
+
+    def save_async(self, path: str, data: bytes, content_type: str = 'image/png'):
+        """Upload in the background, returning a Future of the URL"""
+        return _upload_executor().submit(self.save, path, data, content_type)
+
+    def save_many(self, items: Iterable[Tuple[str, bytes]], content_type: str = 'image/png') -> List[Optional[str]]:
+        """Upload a batch concurrently; failed uploads come back as None"""
+        futures = [self.save_async(path, data, content_type) for path, data in items]
+        urls = []
+        for future in futures:
+            try:
+                urls.append(future.result())
+            except Exception as e:
+                logger.error(f"Error uploading avatar batch item: {str(e)}")
+                urls.append(None)
+        return urls
+
+class GCSAvatarStorage(AvatarStorage):
+    """Google Cloud Storage bucket from GOOGLE_CLOUD_BUCKET_NAME"""
+
+    def __init__(self):
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            # Imported lazily, the SDK is slow to load
+            from google.cloud import storage
+            configure_google_credentials()
+            storage_client = storage.Client(project=settings.GOOGLE_CLOUD_PROJECT_ID)
+            self._bucket = storage_client.bucket(settings.GOOGLE_CLOUD_BUCKET_NAME)
+        return self._bucket
+
+    def exists(self, path):
+        return self.bucket.blob(path).exists()
+
+    def save(self, path, data, content_type='image/png'):
+        blob = self.bucket.blob(path)
+        blob.upload_from_string(data, content_type=content_type)
+        # Do not call blob.make_public()! Uniform bucket-level access is enabled.
+        # To make the file public, set bucket permissions via IAM in the GCP Console.
+        return self.url(path)
+
+    def open(self, path):
+        blob = self.bucket.blob(path)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def url(self, path):
+        return f"https://storage.googleapis.com/{settings.GOOGLE_CLOUD_BUCKET_NAME}/{path}"
+
+class LocalAvatarStorage(AvatarStorage):
+    """Files under MEDIA_ROOT, served by nginx's /media/ location"""
+
+    def __init__(self):
+        self.root = os.path.join(settings.BASE_DIR, settings.MEDIA_ROOT)
+
+    def _full_path(self, path):
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f'Path escapes storage root: {path}')
+        return full_path
+
+    def exists(self, path):
+        return os.path.exists(self._full_path(path))
+
+    def save(self, path, data, content_type='image/png'):
+        full_path = self._full_path(path)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so nginx never serves a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.url(path)
+
+    def open(self, path):
+        try:
+            with open(self._full_path(path), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def url(self, path):
+        return settings.AVATAR_PUBLIC_BASE_URL.rstrip('/') + '/' + path
+
+class InMemoryAvatarStorage(AvatarStorage):
+    """Process-local dict, for tests and offline runs"""
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def exists(self, path):
+        return path in self.files
+
+    def save(self, path, data, content_type='image/png'):
+        with self.lock:
+            self.files[path] = data
+        return self.url(path)
+
+    def open(self, path):
+        return self.files.get(path)
+
+    def url(self, path):
+        return settings.AVATAR_PUBLIC_BASE_URL.rstrip('/') + '/' + path
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_avatar_storage() -> AvatarStorage:
+    """The AVATAR_STORAGE_BACKEND instance for this process"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = import_string(settings.AVATAR_STORAGE_BACKEND)()
+    return _storage
+
+@receiver(setting_changed)
+def reset_avatar_storage(setting, **kwargs):
+    global _storage
+    if setting in ('AVATAR_STORAGE_BACKEND', 'AVATAR_PUBLIC_BASE_URL', 'MEDIA_ROOT'):
+        _storage = None
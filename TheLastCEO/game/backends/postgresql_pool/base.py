@@ -0,0 +1,58 @@
+"""
+PostgreSQL backend whose connections come from a process-wide pool.
+
+Set DB_POOL_ENABLED=true; settings then point ENGINE here with CONN_MAX_AGE
+0, so every close (end of a request or of a db_sync_to_async call) hands the
+connection back instead of dropping the TLS session. Pool options live under
+DATABASES[alias]['POOL'] (see game.db_pool.ConnectionPool).
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.utils.asyncio import async_unsafe
+from game.db_pool import ConnectionPool, get_pool
+
+try:
+    from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+except ImportError:
+    TRANSACTION_STATUS_IDLE = 0
+
+def _check(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+def _reset(connection):
+    # A connection closed inside an atomic block comes back mid-transaction
+    if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _pooled(self):
+        # Test database setup connects without a NAME; keep that unpooled
+        return self.alias != NO_DB_ALIAS
+
+    def pool(self, conn_params) -> ConnectionPool:
+        options = self.settings_dict.get('POOL', {})
+        return get_pool(self.alias, lambda: ConnectionPool(
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 10),
+            check_after=options.get('CHECK_AFTER', 30),
+            check=_check,
+            reset=_reset,
+        ))
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        if not self._pooled():
+            return super().get_new_connection(conn_params)
+        # Normally set while connecting; reused connections skip that
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED)
+        )
+        return self.pool(conn_params).acquire()
+
+    def _close(self):
+        if self.connection is not None and self._pooled():
+            with self.wrap_database_errors:
+                return self.pool(self.get_connection_params()).release(self.connection)
+        return super()._close()
@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+from django.conf import settings
+from django.core.cache import cache
+from .models import GameSession, QuizQuestion
+
+T = TypeVar('T')
+
+_MISSING = object()
+
+class LocalLRU:
+    """Bounded in-process LRU whose entries expire after a few seconds"""
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_namespace(self, name):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == name]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+local_cache = LocalLRU(settings.LOCAL_CACHE_MAX_ENTRIES)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+def _record(name, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss counters per namespace for this process"""
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+class CacheNamespace(Generic[T]):
+    """
+    Two-tier cache for one kind of value: a short-lived process-local LRU in
+    front of the shared Django cache (Redis in production).
+
+    Shared keys look like ``<name>:v<version>:g<generation>:<ident>``. Bump
+    `version` when the cached payload changes shape; invalidate_all() bumps
+    the generation so every entry of the namespace is dropped at once.
+    Other processes may serve a local copy for up to `local_timeout` seconds
+    after an invalidation.
+    """
+
+    def __init__(self, name: str, timeout: int, version: int = 1, local_timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self.version = version
+        self.local_timeout = settings.LOCAL_CACHE_TIMEOUT if local_timeout is None else local_timeout
+
+    def _generation_key(self):
+        return f'{self.name}:v{self.version}:generation'
+
+    def _generation(self):
+        local_key = (self.name, '__generation__')
+        generation = local_cache.get(local_key)
+        if generation is _MISSING:
+            generation = cache.get(self._generation_key(), 0)
+            if self.local_timeout:
+                local_cache.set(local_key, generation, self.local_timeout)
+        return generation
+
+    def key(self, ident: Hashable = '') -> str:
+        return f'{self.name}:v{self.version}:g{self._generation()}:{ident}'
+
+    def get(self, ident: Hashable = '', default: Optional[T] = None) -> Optional[T]:
+        value = local_cache.get((self.name, ident))
+        if value is not _MISSING:
+            _record(self.name, 'local_hits')
+            return value
+        value = cache.get(self.key(ident), _MISSING)
+        if value is _MISSING:
+            _record(self.name, 'misses')
+            return default
+        _record(self.name, 'shared_hits')
+        if self.local_timeout:
+            local_cache.set((self.name, ident), value, self.local_timeout)
+        return value
+
+    def set(self, ident: Hashable, value: T):
+        cache.set(self.key(ident), value, self.timeout)
+        if self.local_timeout:
+            local_cache.set((self.name, ident), value, self.local_timeout)
+
+    def get_or_set(self, ident: Hashable, loader: Callable[[], T]) -> T:
+        value = self.get(ident, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(ident, value)
+        return value
+
+    def invalidate(self, ident: Hashable = ''):
+        local_cache.delete((self.name, ident))
+        cache.delete(self.key(ident))
+
+    def invalidate_all(self):
+        local_cache.delete_namespace(self.name)
+        key = self._generation_key()
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, 1, None)
+
+def _version_key(name, ident):
+    return f'version:{name}:{ident}'
+
+def get_version(name: str, ident: Hashable = '') -> int:
+    """Current value of a version counter, e.g. for ETags"""
+    key = _version_key(name, ident)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so a counter lost to eviction does not
+        # repeat a value a client may still hold
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+def bump_version(name: str, ident: Hashable = ''):
+    try:
+        cache.incr(_version_key(name, ident))
+    except ValueError:
+        # Not seeded yet; the next get_version() starts from the clock
+        pass
+
+# Serialized UserProfileSerializer data by user id. Balance lives here, so
+# other workers may only lag an invalidation by a second.
+profile_cache: CacheNamespace[dict] = CacheNamespace('profile', timeout=300, local_timeout=1)
+# Every active QuizQuestion; games draw their random questions from it
+quiz_question_cache: CacheNamespace[list] = CacheNamespace('quiz_questions', timeout=3600)
+# Display fields of a GameSession by session_id
+session_cache: CacheNamespace[dict] = CacheNamespace('session', timeout=60, local_timeout=1)
+
+def get_quiz_question_pool():
+    """Active quiz questions; callers sample from this instead of ORDER BY random()"""
+    return quiz_question_cache.get_or_set('', lambda: list(QuizQuestion.objects.filter(is_active=True)))
+
+def get_session_metadata(session_id) -> Optional[dict]:
+    """Display fields of a session, or None if it does not exist"""
+    def load():
+        return GameSession.objects.filter(session_id=session_id).values(
+            'session_id', 'status', 'current_stage', 'prize_pool', 'max_players', 'entry_fee'
+        ).first()
+    return session_cache.get_or_set(str(session_id), load)
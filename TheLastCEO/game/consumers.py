@@ -1,9 +1,19 @@
-import json
 import asyncio
 from datetime import datetime, timedelta
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from .db_pool import db_sync_to_async
+from .middleware import TOKEN_SUBPROTOCOL
+from . import json_codec
+from .ratelimit import rate_limited
+from . import leaderboard, ledger
+from .tasks import user_group_name
+from .sprites import get_session_atlas
+from .caching import get_session_metadata, get_quiz_question_pool
+from .statistics import update_statistics
 from .models import GameSession, Player, QuizQuestion, QuizAnswer, RedLightMovement, ChatMessage
 import random
 import math
@@ -20,22 +30,37 @@ class GameConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        # Per-user group for events not tied to the room, like avatar_ready
+        if self.user.is_authenticated:
+            await self.channel_layer.group_add(
+                user_group_name(self.user.id),
+                self.channel_name
+            )
         
-        await self.accept()
+        # Echo the token subprotocol back, browsers drop the socket otherwise
+        if TOKEN_SUBPROTOCOL in self.scope.get('subprotocols', []):
+            await self.accept(subprotocol=TOKEN_SUBPROTOCOL)
+        else:
+            await self.accept()
         
-        # Get player info and send initial state
-        player = await self.get_player()
-        if player:
-            await self.send_game_state()
+        # Seat and initial state in one hop; the seat never changes once joined
+        self.seat, state = await self.load_connection_state()
+        if self.seat:
+            await self.send_game_state(state)
     
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        if self.user.is_authenticated:
+            await self.channel_layer.group_discard(
+                user_group_name(self.user.id),
+                self.channel_name
+            )
     
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = json_codec.loads(text_data)
         message_type = data.get('type')
         
         if message_type == 'chat_message':
@@ -47,10 +72,17 @@ class GameConsumer(AsyncWebsocketConsumer):
         elif message_type == 'ready_check':
             await self.handle_ready_check(data)
     
+    async def get_seat(self):
+        """This connection's player, loaded again only while it has none (joined after connecting)"""
+        if self.seat is None:
+            self.seat = await self.load_seat()
+        return self.seat
+    
+    @rate_limited('chat_message')
     async def handle_chat_message(self, data):
         """Handle chat messages"""
-        player = await self.get_player()
-        if not player:
+        seat = await self.get_seat()
+        if not seat:
             return
         
         message = data.get('message', '').strip()
@@ -58,7 +90,7 @@ class GameConsumer(AsyncWebsocketConsumer):
             return
         
         # Save chat message
-        await self.save_chat_message(player, message)
+        await self.save_chat_message(seat, message)
         
         # Broadcast to all players
         await self.channel_layer.group_send(
@@ -66,44 +98,39 @@ class GameConsumer(AsyncWebsocketConsumer):
             {
                 'type': 'chat_message',
                 'message': {
-                    'player_number': player.player_number,
-                    'nickname': player.user.nickname,
+                    'player_number': seat['player_number'],
+                    'nickname': seat['nickname'],
                     'message': message,
                     'timestamp': timezone.now().isoformat()
                 }
             }
         )
     
+    @rate_limited('quiz_answer')
     async def handle_quiz_answer(self, data):
         """Handle quiz answer submission"""
-        player = await self.get_player()
-        if not player or not player.is_alive:
-            return
-        
-        session = await self.get_session()
-        if session.status != 'quiz':
+        seat = await self.get_seat()
+        if not seat:
             return
         
         question_id = data['question_id']
         answer = data['answer']
         time_taken = data.get('time_taken', 0)
         
-        # Check if player already answered this question
-        already_answered = await self.check_if_already_answered(player, question_id)
-        if already_answered:
+        # Save answer and check if correct; None if the player is out, the
+        # quiz is not running or they already answered
+        is_correct = await self.save_quiz_answer(seat, question_id, answer, time_taken)
+        if is_correct is None:
             return
         
-        # Save answer and check if correct
-        is_correct = await self.save_quiz_answer(player, question_id, answer, time_taken)
-        
         # Broadcast answer received (for real-time feedback)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'quiz_answer_received',
                 'answer_data': {
-                    'player_number': player.player_number,
-                    'nickname': player.user.nickname,
+                    'player_number': seat['player_number'],
+                    'nickname': seat['nickname'],
                     'question_id': question_id,
                     'answer': answer,
                     'is_correct': is_correct,
@@ -112,35 +139,31 @@ class GameConsumer(AsyncWebsocketConsumer):
             }
         )
     
+    @rate_limited('player_movement')
     async def handle_player_movement(self, data):
         """Handle player movement in Red Light Green Light"""
-        player = await self.get_player()
-        if not player or not player.is_alive:
-            return
-        
-        session = await self.get_session()
-        if session.status != 'red_light':
+        seat = await self.get_seat()
+        if not seat:
             return
         
         new_x = data['x']
         new_y = data['y']
         
         # Check if movement is allowed (green light)
-        is_red_light = await self.is_red_light_active()
+        is_red_light = self.is_red_light_active()
         
         if is_red_light:
             # Player moved during red light - eliminate
-            await self.eliminate_player(player, 'red_light')
-        else:
-            # Update player position
-            await self.update_player_position(player, new_x, new_y)
-            
+            elimination = await self.eliminate_moving_player(seat)
+            if elimination:
+                await self.broadcast_elimination(elimination)
+        elif await self.update_player_position(seat, new_x, new_y):
             # Broadcast position update
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'player_movement',
-                    'player_number': player.player_number,
+                    'player_number': seat['player_number'],
                     'x': new_x,
                     'y': new_y
                 }
@@ -148,12 +171,12 @@ class GameConsumer(AsyncWebsocketConsumer):
     
     async def handle_ready_check(self, data):
         """Handle player ready status"""
-        player = await self.get_player()
-        if not player:
+        seat = await self.get_seat()
+        if not seat:
             return
         
         # Mark player as ready and check if all players are ready
-        ready_count = await self.get_ready_count()
+        ready_count = self.get_ready_count()
         total_alive = await self.get_alive_count()
         
         if ready_count >= total_alive and total_alive > 0:
@@ -161,55 +184,55 @@ class GameConsumer(AsyncWebsocketConsumer):
     
     # WebSocket event handlers
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'chat_message',
             'data': event['message']
         }))
     
     async def game_state_update(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'game_state_update',
             'data': event['state']
         }))
     
     async def player_eliminated(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'player_eliminated',
             'data': event['elimination']
         }))
     
     async def stage_transition(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'stage_transition',
             'data': event['stage_info']
         }))
     
     async def quiz_question(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'quiz_question',
             'data': event['question']
         }))
     
     async def quiz_answer_received(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'quiz_answer_received',
             'data': event['answer_data']
         }))
     
     async def quiz_results(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'quiz_results',
             'data': event['results']
         }))
     
     async def red_light_signal(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'red_light_signal',
             'data': event['signal']
         }))
     
     async def player_movement(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'player_movement',
             'data': {
                 'player_number': event['player_number'],
@@ -219,136 +242,174 @@ class GameConsumer(AsyncWebsocketConsumer):
         }))
     
     async def game_finished(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'game_finished',
             'data': event['results']
         }))
     
-    # Database operations
-    @database_sync_to_async
-    def get_player(self):
-        try:
-            return Player.objects.select_related('user').get(
-                session__session_id=self.session_id,
-                user=self.user
-            )
-        except Player.DoesNotExist:
+    async def avatar_atlas(self, event):
+        await self.send(text_data=json_codec.dumps({
+            'type': 'avatar_atlas',
+            'data': event['data']
+        }))
+    
+    async def avatar_ready(self, event):
+        await self.send(text_data=json_codec.dumps({
+            'type': 'avatar_ready',
+            'data': event['data']
+        }))
+    
+    async def avatar_failed(self, event):
+        await self.send(text_data=json_codec.dumps({
+            'type': 'avatar_failed',
+            'data': event['data']
+        }))
+    
+    # Database operations. Each db_sync_to_async call is a thread hop, so a
+    # frame's reads and writes share one call; Django 4.2's aget()/acreate()
+    # are per-call sync_to_async wrappers and would not save any.
+    def _load_seat(self):
+        if not self.user.is_authenticated:
             return None
+        return Player.objects.filter(
+            session__session_id=self.session_id,
+            user=self.user
+        ).values('id', 'player_number', 'session_id', nickname=F('user__nickname')).first()
+    
+    @db_sync_to_async
+    def load_seat(self):
+        return self._load_seat()
     
-    @database_sync_to_async
+    @db_sync_to_async
+    def load_connection_state(self):
+        seat = self._load_seat()
+        return seat, (self._game_state() if seat else None)
+    
+    @db_sync_to_async
     def get_session(self):
         return GameSession.objects.get(session_id=self.session_id)
     
-    @database_sync_to_async
-    def save_chat_message(self, player, message):
+    @db_sync_to_async
+    def save_chat_message(self, seat, message):
         return ChatMessage.objects.create(
-            session=player.session,
-            player=player,
+            session_id=seat['session_id'],
+            player_id=seat['id'],
             message=message
         )
     
-    @database_sync_to_async
-    def check_if_already_answered(self, player, question_id):
-        return QuizAnswer.objects.filter(
-            player=player,
-            question_id=question_id
-        ).exists()
-    
-    @database_sync_to_async
-    def save_quiz_answer(self, player, question_id, answer, time_taken):
-        question = QuizQuestion.objects.get(id=question_id)
-        is_correct = question.correct_answer == answer
-        
-        QuizAnswer.objects.create(
-            player=player,
-            session=player.session,
-            question=question,
-            answer=answer,
-            is_correct=is_correct,
-            time_taken=time_taken
-        )
+    @db_sync_to_async
+    def save_quiz_answer(self, seat, question_id, answer, time_taken):
+        if not Player.objects.filter(pk=seat['id'], is_alive=True, session__status='quiz').exists():
+            return None
+        correct_answer = QuizQuestion.objects.filter(id=question_id).values_list('correct_answer', flat=True).first()
+        if correct_answer is None:
+            return None
+        is_correct = correct_answer == answer
+        
+        try:
+            with transaction.atomic():
+                QuizAnswer.objects.create(
+                    player_id=seat['id'],
+                    session_id=seat['session_id'],
+                    question_id=question_id,
+                    answer=answer,
+                    is_correct=is_correct,
+                    time_taken=time_taken
+                )
+        except IntegrityError:
+            # Already answered, possibly by a concurrent frame
+            return None
         
         return is_correct
     
-    @database_sync_to_async
-    def eliminate_player(self, player, stage):
-        player.is_alive = False
-        player.eliminated_at = timezone.now()
-        player.elimination_stage = {
-            'quiz': 1,
-            'red_light': 2
-        }[stage]
-        player.save()
-        
-        # Send elimination notification
-        asyncio.create_task(self.channel_layer.group_send(
+    @staticmethod
+    def _elimination(player, stage):
+        return {
+            'player_number': player.player_number,
+            'nickname': player.user.nickname,
+            'stage': stage,
+            'eliminated_at': player.eliminated_at.isoformat()
+        }
+    
+    @db_sync_to_async
+    def eliminate_moving_player(self, seat):
+        """Eliminate a player caught moving on red; None unless this call eliminated them"""
+        player = Player.objects.select_related('user').filter(
+            pk=seat['id'], is_alive=True, session__status='red_light'
+        ).first()
+        # eliminate() is False when a concurrent frame got there first
+        if player is None or not player.eliminate(2):
+            return None
+        return self._elimination(player, 'red_light')
+    
+    async def broadcast_elimination(self, elimination):
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'player_eliminated',
-                'elimination': {
-                    'player_number': player.player_number,
-                    'nickname': player.user.nickname,
-                    'stage': stage,
-                    'eliminated_at': player.eliminated_at.isoformat()
-                }
+                'elimination': elimination
             }
-        ))
+        )
     
-    @database_sync_to_async
-    def update_player_position(self, player, x, y):
-        player.position_x = x
-        player.position_y = y
-        player.save()
+    @db_sync_to_async
+    def update_player_position(self, seat, x, y):
+        """Move an alive player during red light; False if they may not move"""
+        return bool(Player.objects.filter(
+            pk=seat['id'], is_alive=True, session__status='red_light'
+        ).update(position_x=x, position_y=y))
     
-    @database_sync_to_async
+    @db_sync_to_async
     def get_alive_count(self):
-        session = GameSession.objects.get(session_id=self.session_id)
-        return session.get_alive_players().count()
+        return GameSession.objects.values_list('alive_count', flat=True).get(session_id=self.session_id)
     
-    @database_sync_to_async
     def get_ready_count(self):
         # This would track ready status - simplified for demo
         return 1
     
-    @database_sync_to_async
     def is_red_light_active(self):
         # This would check current red light status
         # For demo, return random
         return random.choice([True, False])
     
-    async def send_game_state(self):
+    async def send_game_state(self, state=None):
         """Send current game state to client"""
-        session = await self.get_session()
-        players = await self.get_session_players()
-        
-        state = {
-            'session_id': str(session.session_id),
-            'status': session.status,
-            'current_stage': session.current_stage,
-            'prize_pool': float(session.prize_pool),
-            'players': players,
-            'timestamp': timezone.now().isoformat()
-        }
+        if state is None:
+            state = await self.get_game_state()
         
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=json_codec.dumps({
             'type': 'game_state',
             'data': state
         }))
     
-    @database_sync_to_async
-    def get_session_players(self):
-        session = GameSession.objects.get(session_id=self.session_id)
-        players = []
-        for player in session.players.select_related('user').all():
-            players.append({
-                'player_number': player.player_number,
-                'nickname': player.user.nickname,
-                'avatar_color': player.user.avatar_favorite_color,
-                'is_alive': player.is_alive,
-                'position_x': player.position_x,
-                'position_y': player.position_y
-            })
-        return players
+    def _game_state(self):
+        session = get_session_metadata(self.session_id)
+        players = [
+            {
+                'player_number': row['player_number'],
+                'nickname': row['user__nickname'],
+                'avatar_color': row['user__avatar_favorite_color'],
+                'is_alive': row['is_alive'],
+                'position_x': row['position_x'],
+                'position_y': row['position_y']
+            }
+            for row in Player.objects.filter(session__session_id=self.session_id).values(
+                'player_number', 'user__nickname', 'user__avatar_favorite_color',
+                'is_alive', 'position_x', 'position_y'
+            )
+        ]
+        return {
+            'session_id': str(session['session_id']),
+            'status': session['status'],
+            'current_stage': session['current_stage'],
+            'prize_pool': float(session['prize_pool']),
+            'players': players,
+            'avatar_atlas': get_session_atlas(self.session_id),
+            'timestamp': timezone.now().isoformat()
+        }
+    
+    @db_sync_to_async
+    def get_game_state(self):
+        return self._game_state()
     
     async def start_next_stage(self):
         """Start the next game stage"""
@@ -422,27 +483,27 @@ class GameConsumer(AsyncWebsocketConsumer):
             
             await asyncio.sleep(0.5)  # Check every 500ms
     
-    @database_sync_to_async
+    @db_sync_to_async
     def get_new_answers(self, question_id, answered_players):
         """Get new answers for a question"""
         answers = QuizAnswer.objects.filter(
             question_id=question_id,
             session__session_id=self.session_id
-        ).select_related('player__user')
-        
-        new_answers = []
-        for answer in answers:
-            if answer.player.player_number not in answered_players:
-                new_answers.append({
-                    'player_number': answer.player.player_number,
-                    'nickname': answer.player.user.nickname,
-                    'question_id': question_id,
-                    'answer': answer.answer,
-                    'is_correct': answer.is_correct,
-                    'time_taken': answer.time_taken
-                })
+        ).exclude(player__player_number__in=answered_players).values(
+            'answer', 'is_correct', 'time_taken', 'player__player_number', 'player__user__nickname'
+        )
         
-        return new_answers
+        return [
+            {
+                'player_number': answer['player__player_number'],
+                'nickname': answer['player__user__nickname'],
+                'question_id': question_id,
+                'answer': answer['answer'],
+                'is_correct': answer['is_correct'],
+                'time_taken': answer['time_taken']
+            }
+            for answer in answers
+        ]
     
     async def show_question_results(self, question_id):
         """Show results for a specific question"""
@@ -461,7 +522,7 @@ class GameConsumer(AsyncWebsocketConsumer):
             }
         )
     
-    @database_sync_to_async
+    @db_sync_to_async
     def get_question_results(self, question_id):
         """Get results for a specific question"""
         question = QuizQuestion.objects.get(id=question_id)
@@ -515,77 +576,57 @@ class GameConsumer(AsyncWebsocketConsumer):
         await self.update_session_status('freedom_room')
         
         # Calculate and distribute prizes
-        await self.distribute_prizes()
+        results = await self.distribute_prizes()
+        if results:
+            # Send final results
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'game_finished',
+                    'results': results
+                }
+            )
     
-    @database_sync_to_async
+    @db_sync_to_async
     def update_session_status(self, status):
         session = GameSession.objects.get(session_id=self.session_id)
         session.status = status
         session.stage_start_time = timezone.now()
+        # The quiz is the first stage; survival times are measured from here
+        if status == 'quiz' and session.started_at is None:
+            session.started_at = session.stage_start_time
         session.save()
     
-    @database_sync_to_async
+    @db_sync_to_async
     def get_quiz_questions(self):
-        return list(QuizQuestion.objects.filter(is_active=True).order_by('?')[:6])
+        pool = get_quiz_question_pool()
+        return random.sample(pool, min(6, len(pool)))
     
     async def process_quiz_results(self):
         """Process quiz results and eliminate players"""
-        # Get all quiz answers and eliminate bottom performers
-        session = await self.get_session()
-        players = await self.get_alive_players()
-        
-        # Calculate scores based on correct answers and speed
-        player_scores = await self.calculate_player_scores()
-        
-        # Sort players by score and eliminate bottom 30%
-        elimination_count = max(1, len(players) * 30 // 100)
-        
-        # Eliminate players with lowest scores
-        for i in range(elimination_count):
-            if player_scores:
-                worst_player = min(player_scores, key=lambda x: x['score'])
-                player = await self.get_player_by_number(worst_player['player_number'])
-                if player:
-                    await self.eliminate_player(player, 'quiz')
-                player_scores.remove(worst_player)
-    
-    @database_sync_to_async
-    def calculate_player_scores(self):
-        """Calculate scores for all players based on quiz performance"""
+        for elimination in await self.eliminate_quiz_losers():
+            await self.broadcast_elimination(elimination)
+    
+    @db_sync_to_async
+    def eliminate_quiz_losers(self):
+        """Eliminate the bottom 30% of alive players by quiz score, in one hop"""
         session = GameSession.objects.get(session_id=self.session_id)
-        players = session.get_alive_players()
-        
-        player_scores = []
-        for player in players:
-            answers = QuizAnswer.objects.filter(
-                player=player,
-                session=session
-            )
-            
-            correct_answers = answers.filter(is_correct=True).count()
-            total_time = sum(answer.time_taken for answer in answers if answer.is_correct)
-            
-            # Score based on correct answers and speed (lower time = higher score)
-            score = correct_answers * 100 - total_time
-            player_scores.append({
-                'player_number': player.player_number,
-                'score': score,
-                'correct_answers': correct_answers,
-                'total_time': total_time
-            })
+        correct = Q(quiz_answers__session=session, quiz_answers__is_correct=True)
+        players = list(session.get_alive_players().select_related('user').annotate(
+            correct_answers=Count('quiz_answers', filter=correct),
+            total_time=Coalesce(Sum('quiz_answers__time_taken', filter=correct), 0.0)
+        ).order_by('id'))
+        
+        # Score based on correct answers and speed (lower time = higher score)
+        players.sort(key=lambda player: player.correct_answers * 100 - player.total_time)
+        elimination_count = max(1, len(players) * 30 // 100)
         
-        return player_scores
-    
-    @database_sync_to_async
-    def get_player_by_number(self, player_number):
-        """Get player by player number"""
-        try:
-            return Player.objects.get(
-                session__session_id=self.session_id,
-                player_number=player_number
-            )
-        except Player.DoesNotExist:
-            return None
+        eliminations = []
+        for player in players[:elimination_count]:
+            # eliminate() is False when a concurrent frame got there first
+            if player.eliminate(1):
+                eliminations.append(self._elimination(player, 'quiz'))
+        return eliminations
     
     async def run_red_light_sequence(self):
         """Run the red light green light sequence"""
@@ -628,68 +669,60 @@ class GameConsumer(AsyncWebsocketConsumer):
         # Eliminate players who didn't reach the end
         await self.eliminate_slow_players()
     
-    @database_sync_to_async
+    @db_sync_to_async
     def distribute_prizes(self):
-        """Distribute prizes to winners"""
+        """Distribute prizes to winners; returns the game_finished results, or None without winners"""
         session = GameSession.objects.get(session_id=self.session_id)
-        winners = session.get_alive_players()
+        winners = list(session.get_alive_players().select_related('user'))
         
-        if winners.exists():
-            prize_per_winner = session.prize_pool / winners.count()
+        if winners:
+            prize_per_winner = ledger.to_cents(session.prize_pool / len(winners))
             
             results = []
             for player in winners:
-                player.final_prize = prize_per_winner
-                player.save()
-                
-                # Update user balance and stats
-                user = player.user
-                user.balance += prize_per_winner
-                user.total_earnings += prize_per_winner
-                user.total_games_won += 1
-                user.save()
+                with transaction.atomic():
+                    player.final_prize = prize_per_winner
+                    player.save(update_fields=['final_prize'])
+                    
+                    # Update user balance and stats; a rerun finds the
+                    # payout already posted and pays nothing twice
+                    _, paid = ledger.post(
+                        player.user_id, prize_per_winner, 'payout',
+                        ledger.payout_key(session, player.user_id), session=session,
+                        total_earnings=prize_per_winner, total_games_won=1
+                    )
+                    if paid:
+                        transaction.on_commit(
+                            lambda user_id=player.user_id: leaderboard.record_payout(user_id, prize_per_winner)
+                        )
                 
                 results.append({
                     'player_number': player.player_number,
-                    'nickname': user.nickname,
+                    'nickname': player.user.nickname,
                     'prize': float(prize_per_winner)
                 })
-            
-            # Send final results
-            asyncio.create_task(self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'game_finished',
-                    'results': {
-                        'winners': results,
-                        'total_prize_pool': float(session.prize_pool)
-                    }
-                }
-            ))
         
         # Update session status
         session.status = 'finished'
         session.finished_at = timezone.now()
         session.save()
+        update_statistics(session)
+        
+        if winners:
+            return {
+                'winners': results,
+                'total_prize_pool': float(session.prize_pool)
+            }
+        return None
     
-    @database_sync_to_async
-    def get_alive_players(self):
-        session = GameSession.objects.get(session_id=self.session_id)
-        return list(session.get_alive_players())
-    
-    @database_sync_to_async
+    @db_sync_to_async
     def eliminate_slow_players(self):
         """Eliminate players who didn't reach the finish line"""
         session = GameSession.objects.get(session_id=self.session_id)
-        alive_players = session.get_alive_players()
-        
-        # Eliminate players who didn't move far enough (simplified)
-        for player in alive_players:
-            if player.position_x < 90:  # Didn't reach 90% of the way
-                player.is_alive = False
-                player.eliminated_at = timezone.now()
-                player.elimination_stage = 2
-                player.save()
+        
+        # Eliminate players who didn't move far enough (simplified):
+        # didn't reach 90% of the way
+        session.eliminate_players(session.players.filter(position_x__lt=90), 2)
     
     async def check_quiz_completion(self):
         """Check if quiz stage is complete"""
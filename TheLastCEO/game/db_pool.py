@@ -0,0 +1,229 @@
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the pool timeout"""
+
+class PoolStats:
+    """Checkout and wait-time counters of one pool (or of the DB executor)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.waited = 0  # checkouts that had to wait for a free slot
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.timeouts = 0
+            self.connects = 0
+            self.discarded = 0
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds >= 0.001:
+                self.waited += 1
+        if seconds >= settings.DB_POOL_SLOW_WAIT:
+            logger.warning(f"Waited {seconds * 1000:.0f}ms for a database connection")
+
+    def increment(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'waited': self.waited,
+                'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                'wait_max_ms': self.wait_max * 1000,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'discarded': self.discarded,
+            }
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections.
+
+    At most `max_size` connections are open at once; a checkout beyond that
+    waits up to `timeout` seconds and then raises PoolTimeout. Connections
+    idle for longer than `check_after` seconds are pinged with `check` before
+    reuse, and ones that fail or are closed get replaced. `reset` runs on
+    every return, e.g. to roll back an abandoned transaction.
+    """
+
+    def __init__(self, connect: Callable, max_size: int, timeout: float, check_after: float = 30,
+                 check: Optional[Callable] = None, reset: Optional[Callable] = None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.check = check
+        self.reset = reset
+        self.idle = deque()  # (connection, returned_at), most recent last
+        self.size = 0
+        self.condition = threading.Condition()
+        self.stats = PoolStats()
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        self.stats.increment('connects')
+        return connection
+
+    def _usable(self, connection, returned_at):
+        if getattr(connection, 'closed', False):
+            return False
+        if self.check is None or time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            self.check(connection)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        self.stats.increment('discarded')
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self.condition:
+            while True:
+                if self.idle:
+                    # LIFO: the warmest connection, and idle ones age out
+                    connection, returned_at = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.increment('timeouts')
+                    raise PoolTimeout(f'No database connection free within {self.timeout}s')
+                self.condition.wait(remaining)
+        self.stats.record_wait(time.monotonic() - started)
+
+        if connection is None:
+            return self._open()
+        if not self._usable(connection, returned_at):
+            # Keeps its slot; only the connection is replaced
+            self._discard(connection)
+            return self._open()
+        return connection
+
+    def release(self, connection):
+        try:
+            if getattr(connection, 'closed', False):
+                raise ConnectionError('closed')
+            if self.reset is not None:
+                self.reset(connection)
+        except Exception:
+            self._discard(connection)
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close(self):
+        """Close idle connections; checked-out ones close when returned"""
+        with self.condition:
+            while self.idle:
+                connection, _ = self.idle.popleft()
+                self.size -= 1
+                self._discard(connection)
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(alias: str, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """Process-wide pool of a database alias, created by `factory` on first use"""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = factory()
+    return pool
+
+executor_stats = PoolStats()
+
+def pool_stats() -> Dict[str, dict]:
+    """Wait-time metrics of every pool in this process, plus the DB executor queue"""
+    stats = {alias: pool.stats.as_dict() for alias, pool in list(_pools.items())}
+    stats['executor'] = executor_stats.as_dict()
+    return stats
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Threads that run db_sync_to_async calls; size it to the connection pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix='db'
+                )
+    return _executor
+
+class PooledDatabaseSyncToAsync:
+    """
+    database_sync_to_async on a dedicated, bounded executor instead of the
+    single thread-sensitive thread. Each call checks a connection out of the
+    pool and returns it afterwards, so DB_EXECUTOR_WORKERS caps the number
+    of connections consumers hold; time queued for a thread is recorded in
+    executor_stats. With DB_EXECUTOR_WORKERS=0 calls stay thread-sensitive.
+    """
+
+    def __init__(self, func):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.thread_sensitive = DatabaseSyncToAsync(func)
+        self.pooled = None
+
+    def _timed(self, submitted_at, *args, **kwargs):
+        executor_stats.record_wait(time.monotonic() - submitted_at)
+        return self.func(*args, **kwargs)
+
+    async def __call__(self, *args, **kwargs):
+        if not settings.DB_EXECUTOR_WORKERS:
+            return await self.thread_sensitive(*args, **kwargs)
+        if self.pooled is None:
+            self.pooled = DatabaseSyncToAsync(self._timed, thread_sensitive=False, executor=get_db_executor())
+        return await self.pooled(time.monotonic(), *args, **kwargs)
+
+    def __get__(self, parent, objtype):
+        # Bind like a method, as SyncToAsync does
+        return functools.partial(self.__call__, parent)
+
+db_sync_to_async = PooledDatabaseSyncToAsync
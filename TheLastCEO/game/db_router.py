@@ -0,0 +1,97 @@
+"""
+Read-replica routing.
+
+Nothing goes to the replica unless it is explicitly marked read-only:
+
+    @read_only                  # a whole view, command or function
+    def available_games(request): ...
+
+    with read_only():           # a block of querysets
+        rows = list(queryset)
+
+Inside a request, the first write pins every later read of that request to
+the primary, so a view never reads its own write from a lagging replica.
+Without DATABASE_REPLICA_URL everything stays on the primary.
+"""
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from typing import Callable, Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_read_only: ContextVar[bool] = ContextVar('db_read_only', default=False)
+# {'wrote': bool} for the current request, set by ReplicaRoutingMiddleware
+_request_state: ContextVar[Optional[dict]] = ContextVar('db_request_state', default=None)
+
+class ReadOnlyScope(ContextDecorator):
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call; concurrent calls must not share a token
+        return self.__class__()
+
+    def __enter__(self):
+        self.token = _read_only.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        _read_only.reset(self.token)
+        return False
+
+def read_only(func: Optional[Callable] = None):
+    """Route reads in this scope to the replica, unless the request already wrote"""
+    if func is None:
+        return ReadOnlyScope()
+    return ReadOnlyScope()(func)
+
+def pinned_to_primary() -> bool:
+    state = _request_state.get()
+    return bool(state and state['wrote'])
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICA and _read_only.get() and not pinned_to_primary():
+            return settings.DATABASE_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.DATABASE_REPLICA
+
+class ReplicaRoutingMiddleware:
+    """
+    Scopes read-your-writes stickiness to one request. Sync and async
+    capable, so it does not make Django adapt the chain under ASGI; the
+    state is a dict, so writes in sync views run in a thread still pin it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request_state.set({'wrote': False})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+    async def __acall__(self, request):
+        token = _request_state.set({'wrote': False})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_state.reset(token)
@@ -0,0 +1,153 @@
+"""
+Streaming exports of session results, answer logs and chat.
+
+Rows come from values_list(...).iterator(chunk_size=...) projections and
+are encoded straight into CSV or JSONL chunks, optionally gzipped on the fly,
+so memory stays flat however many rows an export has. Sessions that have
+been archived are read from their SessionArchive instead of the live tables.
+"""
+import csv
+import zlib
+from typing import AsyncIterator, Iterable, Iterator, Optional, Sequence
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+from . import json_codec
+from .archive import read_archive
+from .models import ChatMessage, Player, QuizAnswer, SessionArchive
+
+CHUNK_SIZE = 2000
+# Encoded output is handed on in pieces of about this size
+FLUSH_BYTES = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Exported columns and the live-table fields they are read from
+RESULT_COLUMNS = {
+    'session_id': 'session__session_id',
+    'status': 'session__status',
+    'started_at': 'session__started_at',
+    'finished_at': 'session__finished_at',
+    'player_number': 'player_number',
+    'nickname': 'user__nickname',
+    'joined_at': 'joined_at',
+    'is_alive': 'is_alive',
+    'elimination_stage': 'elimination_stage',
+    'eliminated_at': 'eliminated_at',
+    'final_prize': 'final_prize',
+}
+ANSWER_COLUMNS = {
+    'session_id': 'session__session_id',
+    'player_number': 'player__player_number',
+    'question_id': 'question_id',
+    'answer': 'answer',
+    'is_correct': 'is_correct',
+    'time_taken': 'time_taken',
+    'answered_at': 'answered_at',
+}
+CHAT_COLUMNS = {
+    'session_id': 'session__session_id',
+    'player_number': 'player__player_number',
+    'message': 'message',
+    'is_system_message': 'is_system_message',
+    'timestamp': 'timestamp',
+}
+
+# dataset: (model, columns, archived table or None)
+DATASETS = {
+    'results': (Player, RESULT_COLUMNS, None),
+    'answers': (QuizAnswer, ANSWER_COLUMNS, 'quiz_answers'),
+    'chat': (ChatMessage, CHAT_COLUMNS, 'chat_messages'),
+}
+
+_encoder = JSONEncoder()
+
+def export_rows(dataset: str, session_ids: Optional[Sequence] = None,
+                using: Optional[str] = None) -> Iterator[tuple]:
+    """Rows of `dataset` as tuples in column order, for every session or just `session_ids`"""
+    model, columns, table = DATASETS[dataset]
+    names = list(columns)
+    queryset = model.objects.using(using).order_by('id')
+    if session_ids is not None:
+        queryset = queryset.filter(session__session_id__in=session_ids)
+    if table is not None:
+        # Archived sessions may still have rows whose delete was interrupted
+        queryset = queryset.filter(session__archive__isnull=True)
+    yield from queryset.values_list(*columns.values()).iterator(chunk_size=CHUNK_SIZE)
+
+    if table is None:
+        return
+    archives = SessionArchive.objects.using(using).select_related('session').only(
+        'codec', 'data', 'session__session_id'
+    ).order_by('id')
+    if session_ids is not None:
+        archives = archives.filter(session__session_id__in=session_ids)
+    # One archive in memory at a time
+    for archive in archives.iterator(chunk_size=1):
+        session_id = archive.session.session_id
+        for row in read_archive(archive)[table]:
+            row['session_id'] = session_id
+            yield tuple(row[name] for name in names)
+
+def _cell(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    # Dates, decimals and UUIDs render as they do in the API and in archives
+    return _encoder.default(value)
+
+class _Line:
+    """File-like target that hands csv.writer's output straight back"""
+
+    def write(self, value):
+        return value
+
+def encode(dataset: str, rows: Iterable[tuple], fmt: str) -> Iterator[bytes]:
+    """CSV (with a header row) or JSONL bytes of `rows`, in pieces of about FLUSH_BYTES"""
+    names = list(DATASETS[dataset][1])
+    buffer = []
+    size = 0
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        buffer.append(writer.writerow(names).encode())
+        lines = (writer.writerow([_cell(value) for value in row]).encode() for row in rows)
+    else:
+        lines = (json_codec.dumps_bytes(dict(zip(names, row))) + b'\n' for row in rows)
+
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a stream of chunks as it is produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export(dataset: str, fmt: str, session_ids: Optional[Sequence] = None,
+           using: Optional[str] = None, gzip: bool = False) -> Iterator[bytes]:
+    chunks = encode(dataset, export_rows(dataset, session_ids, using), fmt)
+    return gzip_chunks(chunks) if gzip else chunks
+
+async def async_chunks(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Serve a sync export under ASGI, where Django would otherwise read the
+    whole iterator into memory first. Thread-sensitive, so every chunk is
+    read on the thread holding the export's cursor.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
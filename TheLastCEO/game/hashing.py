@@ -0,0 +1,66 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+class HashingOverloaded(Exception):
+    """Raised when too many password hashes are already queued"""
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+def get_executor():
+    """Lazily create the process pool shared by all requests in this worker"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Not fork: forking the ASGI process would copy its DB and Redis
+                # sockets and any lock a DB-executor thread holds at that moment
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=_init_worker
+                )
+    return _executor
+
+def _acquire_slot():
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASHING_MAX_PENDING:
+            raise HashingOverloaded()
+        _pending += 1
+
+def _release_slot():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+async def _run(func, *args):
+    _acquire_slot()
+    try:
+        if settings.PASSWORD_HASHING_WORKERS > 0:
+            return await asyncio.wrap_future(get_executor().submit(func, *args))
+        # No pool configured: still keep hashing off the event loop
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    finally:
+        _release_slot()
+
+async def make_password_async(password):
+    """Hash a password outside the request path, raising HashingOverloaded under load"""
+    return await _run(make_password, password)
+
+async def check_password_async(password, encoded):
+    """Verify a password outside the request path, raising HashingOverloaded under load"""
+    return await _run(check_password, password, encoded)
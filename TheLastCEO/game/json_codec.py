@@ -0,0 +1,60 @@
+import json
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+# Datetimes are passed through to DRF's encoder so they render exactly as
+# before (millisecond precision, "Z" for UTC); Decimal, lazy strings and
+# querysets go there too. orjson handles UUIDs natively.
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+_encoder = JSONEncoder()
+
+def dumps_bytes(data) -> bytes:
+    """Encode to compact UTF-8 JSON, the way DRF's JSONRenderer would"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+def dumps(data) -> str:
+    """Encode to a JSON str, e.g. for WebSocket text frames"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS).decode()
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+def loads(data):
+    """Decode JSON from str or bytes; raises ValueError on invalid input"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer using orjson when installed; pretty-printed output still uses the stdlib"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = dumps_bytes(data)
+        # Same JavaScript-safe escaping as JSONRenderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser using orjson when installed"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
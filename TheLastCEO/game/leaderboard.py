@@ -0,0 +1,141 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Sum
+from django.utils import timezone
+from redis.exceptions import RedisError
+from .models import User, Player
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('global', 'daily', 'weekly')
+KEY_PREFIX = 'leaderboard'
+# Windowed boards stay around a little past their window so "yesterday" still resolves
+WINDOW_TTL = {
+    'daily': timedelta(days=2),
+    'weekly': timedelta(days=15),
+}
+REBUILD_CHUNK_SIZE = 2000
+
+def board_key(period, when=None):
+    """Redis key of the sorted set for `period` covering `when` (default: now)"""
+    if period == 'global':
+        return f'{KEY_PREFIX}:global'
+    day = timezone.localdate(when or timezone.now())
+    if period == 'daily':
+        return f'{KEY_PREFIX}:daily:{day.isoformat()}'
+    if period == 'weekly':
+        year, week, _ = day.isocalendar()
+        return f'{KEY_PREFIX}:weekly:{year}-W{week:02d}'
+    raise ValueError(f'Unknown leaderboard period: {period}')
+
+def window_bounds(period, when=None):
+    """Aware [start, end) datetimes of the daily/weekly window containing `when`"""
+    day = timezone.localdate(when or timezone.now())
+    if period == 'daily':
+        start_day, days = day, 1
+    elif period == 'weekly':
+        start_day, days = day - timedelta(days=day.weekday()), 7
+    else:
+        raise ValueError(f'Period {period} has no window')
+    start = timezone.make_aware(datetime.combine(start_day, time.min))
+    return start, start + timedelta(days=days)
+
+def record_payout(user_id, amount, when=None):
+    """Add a prize to every board; called once a payout is committed"""
+    amount = float(amount)
+    if amount <= 0:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for period in PERIODS:
+            key = board_key(period, when)
+            pipe.zincrby(key, amount, user_id)
+            if period in WINDOW_TTL:
+                pipe.expire(key, WINDOW_TTL[period])
+        pipe.execute()
+    except RedisError as e:
+        # Boards can be repaired with `manage.py rebuild_leaderboards`
+        logger.error(f"Error updating leaderboards for user {user_id}: {str(e)}")
+
+def get_page(period, offset=0, limit=20):
+    """Entries ranked offset+1..offset+limit, best first"""
+    redis = get_redis()
+    key = board_key(period)
+    pipe = redis.pipeline(transaction=False)
+    pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+    pipe.zcard(key)
+    entries, total = pipe.execute()
+
+    user_ids = [int(member) for member, _ in entries]
+    profiles = {
+        row['id']: row for row in
+        User.objects.filter(pk__in=user_ids).values('id', 'nickname', 'avatar_url')
+    }
+    results = []
+    for rank, (member, score) in enumerate(entries, start=offset + 1):
+        profile = profiles.get(int(member), {})
+        results.append({
+            'rank': rank,
+            'user_id': int(member),
+            'nickname': profile.get('nickname'),
+            'avatar_url': profile.get('avatar_url'),
+            'earnings': score
+        })
+    return results, total
+
+def get_rank(period, user_id):
+    """(rank, earnings) of a user on a board, or (None, 0) if they have not scored"""
+    pipe = get_redis().pipeline(transaction=False)
+    key = board_key(period)
+    pipe.zrevrank(key, user_id)
+    pipe.zscore(key, user_id)
+    rank, score = pipe.execute()
+    if rank is None:
+        return None, 0
+    return rank + 1, score
+
+def _replace_board(key, rows, ttl=None):
+    """Load (user_id, score) rows into a temp key and swap it in atomically"""
+    redis = get_redis()
+    tmp_key = f'{key}:rebuild'
+    redis.delete(tmp_key)
+    count = 0
+    batch = {}
+    for user_id, score in rows:
+        batch[user_id] = float(score)
+        if len(batch) >= REBUILD_CHUNK_SIZE:
+            redis.zadd(tmp_key, batch)
+            count += len(batch)
+            batch = {}
+    if batch:
+        redis.zadd(tmp_key, batch)
+        count += len(batch)
+
+    pipe = redis.pipeline()
+    if count:
+        pipe.rename(tmp_key, key)
+        if ttl:
+            pipe.expire(key, ttl)
+    else:
+        pipe.delete(key)
+    pipe.execute()
+    return count
+
+def rebuild(period, when=None):
+    """Recompute one board from Postgres, returning the number of entries"""
+    if period == 'global':
+        rows = User.objects.filter(total_earnings__gt=0).values_list(
+            'id', 'total_earnings'
+        ).iterator(chunk_size=REBUILD_CHUNK_SIZE)
+        return _replace_board(board_key(period), rows)
+
+    start, end = window_bounds(period, when)
+    rows = Player.objects.filter(
+        final_prize__gt=0,
+        session__finished_at__gte=start,
+        session__finished_at__lt=end
+    ).values('user_id').annotate(
+        earnings=Sum('final_prize')
+    ).values_list('user_id', 'earnings').iterator(chunk_size=REBUILD_CHUNK_SIZE)
+    return _replace_board(board_key(period, when), rows, WINDOW_TTL[period])
@@ -0,0 +1,79 @@
+from decimal import Decimal, ROUND_DOWN
+from typing import Optional, Tuple
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .caching import bump_version, profile_cache
+from .middleware import user_cache_key
+from .models import BalanceTransaction, GameSession, User
+
+CENT = Decimal('0.01')
+
+class InsufficientBalance(Exception):
+    pass
+
+def entry_fee_key(session: GameSession, user_id, attempt: int) -> str:
+    """One key per seat taken; `attempt` counts the user's earlier fees for the session"""
+    return f'entry_fee:{session.session_id}:{user_id}:{attempt}'
+
+def payout_key(session: GameSession, user_id) -> str:
+    return f'payout:{session.session_id}:{user_id}'
+
+def opening_key(user_id) -> str:
+    return f'opening:{user_id}'
+
+def to_cents(amount) -> Decimal:
+    """Round an amount down to whole cents, as ledger rows are stored"""
+    return Decimal(amount).quantize(CENT, rounding=ROUND_DOWN)
+
+def invalidate_user_caches(user_id):
+    """Drop every cached copy of a user; queryset updates do not fire post_save"""
+    cache.delete(user_cache_key(user_id))
+    profile_cache.invalidate(user_id)
+    bump_version('profile', user_id)
+
+@transaction.atomic(savepoint=False)
+def post(user_id, amount, kind: str, idempotency_key: str, session: Optional[GameSession] = None,
+         **counters) -> Tuple[BalanceTransaction, bool]:
+    """
+    Append a ledger row and apply it to User.balance with a single F() update,
+    so concurrent fees and payouts never read-modify-write the user row.
+
+    Debits only apply while the balance covers them, otherwise
+    InsufficientBalance is raised and nothing is written. Reposting an
+    idempotency key returns the existing row and (row, False) without
+    touching the balance. `counters` are extra F() increments applied with
+    the row, e.g. total_games_won=1.
+
+    Joins the caller's transaction without a savepoint of its own, so
+    InsufficientBalance has to propagate out of the caller's atomic block.
+    """
+    amount = to_cents(amount)
+    try:
+        with transaction.atomic():
+            entry = BalanceTransaction.objects.create(
+                user_id=user_id, session=session, amount=amount, kind=kind, idempotency_key=idempotency_key
+            )
+    except IntegrityError:
+        return BalanceTransaction.objects.get(idempotency_key=idempotency_key), False
+
+    users = User.objects.filter(pk=user_id)
+    if amount < 0:
+        users = users.filter(balance__gte=-amount)
+    updated = users.update(
+        balance=F('balance') + amount,
+        **{field: F(field) + value for field, value in counters.items()}
+    )
+    if not updated:
+        # Rolls the ledger row back with the caller's transaction
+        raise InsufficientBalance(f'User {user_id} cannot cover {-amount}')
+    transaction.on_commit(lambda: invalidate_user_caches(user_id))
+    return entry, True
+
+def record_opening_balance(user: User) -> BalanceTransaction:
+    """Ledger row for the balance a user starts with; the balance itself is already set"""
+    entry, _ = BalanceTransaction.objects.get_or_create(
+        idempotency_key=opening_key(user.pk),
+        defaults={'user': user, 'amount': user.balance, 'kind': 'opening'}
+    )
+    return entry
@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from game.archive import archive_finished_sessions
+
+class Command(BaseCommand):
+    help = "Compress finished sessions' answers, chat and movements into SessionArchive rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-hours', type=float, default=settings.SESSION_ARCHIVE_AFTER_HOURS,
+            help='Only sessions finished at least this long ago'
+        )
+        parser.add_argument('--limit', type=int, help='Archive at most this many sessions')
+
+    def handle(self, *args, **options):
+        archived = archive_finished_sessions(
+            older_than=timedelta(hours=options['older_than_hours']),
+            limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} sessions'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from game.statistics import backfill_statistics
+
+class Command(BaseCommand):
+    help = 'Compute GameStatistics for finished sessions that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Sessions per aggregate query')
+
+    def handle(self, *args, **options):
+        total = 0
+        for filled in backfill_statistics(options['chunk_size']):
+            total += filled
+            self.stdout.write(f'Filled {total} sessions')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled statistics for {total} sessions'))
@@ -1,17 +1,14 @@
 from django.core.management.base import BaseCommand
-from game.models import QuizQuestion
+from game.question_bank import import_questions
 
 class Command(BaseCommand):
     help = 'Create quiz questions for the game'
 
     def handle(self, *args, **options):
-        # Clear existing questions
-        QuizQuestion.objects.all().delete()
-        self.stdout.write('Cleared existing quiz questions')
-
         # Define the questions with correct answers
         questions_data = [
             {
+                'external_id': 'incubator-1',
                 'question_text': 'Как пишется полное имя Бахи:',
                 'option_a': 'Баха',
                 'option_b': 'Бахаудин',
@@ -22,6 +19,7 @@ class Command(BaseCommand):
                 'category': 'incubator'
             },
             {
+                'external_id': 'incubator-2',
                 'question_text': 'Какой самый любимый звук бернара:',
                 'option_a': 'Ааахх',
                 'option_b': 'Аааахххх',
@@ -32,6 +30,7 @@ class Command(BaseCommand):
                 'category': 'incubator'
             },
             {
+                'external_id': 'incubator-3',
                 'question_text': 'Самый лучший проект за всю историю инкубатора:',
                 'option_a': 'EPITET',
                 'option_b': 'Talapacademy',
@@ -42,6 +41,7 @@ class Command(BaseCommand):
                 'category': 'incubator'
             },
             {
+                'external_id': 'incubator-4',
                 'question_text': 'Кто украл HDMI?',
                 'option_a': 'Бахредин',
                 'option_b': 'Асхат Самедулла',
@@ -52,6 +52,7 @@ class Command(BaseCommand):
                 'category': 'incubator'
             },
             {
+                'external_id': 'incubator-5',
                 'question_text': 'Существует ли Аймурат на самом деле?',
                 'option_a': 'Да',
                 'option_b': 'Нет',
@@ -62,6 +63,7 @@ class Command(BaseCommand):
                 'category': 'incubator'
             },
             {
+                'external_id': 'incubator-6',
                 'question_text': 'Какое самое крутое названиие проекта:',
                 'option_a': 'Куока AI',
                 'option_b': 'Мено AI',
@@ -73,13 +75,12 @@ class Command(BaseCommand):
             }
         ]
 
-        # Create questions
-        created_count = 0
-        for question_data in questions_data:
-            question = QuizQuestion.objects.create(**question_data)
-            created_count += 1
-            self.stdout.write(f'Created question: {question.question_text}')
+        # Upsert by external_id so answers to these questions survive a rerun;
+        # questions not in this list are deactivated, not deleted
+        counts = import_questions(enumerate(questions_data, 1), replace=True)
 
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully created {created_count} quiz questions')
-        ) 
\ No newline at end of file
+            self.style.SUCCESS(
+                f"Successfully created {counts['created']} and updated {counts['updated']} quiz questions"
+            )
+        )
@@ -0,0 +1,33 @@
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from game import exports
+from game.db_router import read_only
+
+class Command(BaseCommand):
+    help = 'Stream session results, quiz answers or chat to a CSV or JSONL file, archived sessions included'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=exports.DATASETS)
+        parser.add_argument('path', help='Output file; a .gz suffix gzips it')
+        parser.add_argument('--format', choices=exports.FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--session', action='append', help='Only this session UUID (repeatable)')
+
+    @read_only
+    def handle(self, *args, **options):
+        path = options['path']
+        gzip = path.endswith('.gz')
+        fmt = options['format'] or path[:-3 if gzip else None].rsplit('.', 1)[-1]
+        if fmt not in exports.FORMATS:
+            raise CommandError(f"Cannot tell the format of {path}; pass --format {' or '.join(exports.FORMATS)}")
+        try:
+            session_ids = [uuid.UUID(value) for value in options['session'] or []]
+        except ValueError as e:
+            raise CommandError(f'Invalid session UUID: {e}')
+
+        written = 0
+        with open(path, 'wb') as f:
+            for chunk in exports.export(options['dataset'], fmt, session_ids or None, gzip=gzip):
+                f.write(chunk)
+                written += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {options['dataset']} to {path} ({written} bytes)"))
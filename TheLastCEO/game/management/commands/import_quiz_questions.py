@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.question_bank import BATCH_SIZE, QuestionImportError, import_questions, read_rows
+
+class Command(BaseCommand):
+    help = 'Upsert quiz questions from a CSV or JSONL file, keyed on external_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or JSONL with one question object per line')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Questions upserted per query')
+        parser.add_argument('--replace', action='store_true', help='Deactivate questions missing from the file')
+
+    def handle(self, *args, **options):
+        try:
+            counts = import_questions(
+                read_rows(options['path'], options['format']),
+                batch_size=options['batch_size'],
+                replace=options['replace']
+            )
+        except (OSError, QuestionImportError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['read']} questions: {counts['created']} created, "
+            f"{counts['updated']} updated, {counts['active']} active"
+        ))
@@ -0,0 +1,94 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import product
+from django.core.management.base import BaseCommand
+from game.avatar_service import (
+    AvatarGenerationService, FakeAvatarGenerator, avatar_attributes_key, avatar_blob_path
+)
+from game.serializers import AvatarCustomizationSerializer
+
+ATTRIBUTE_FIELDS = ['headwear', 'accessory', 'gender', 'favorite_color']
+
+def attribute_combinations():
+    """Every attribute tuple AvatarCustomizationSerializer accepts"""
+    fields = AvatarCustomizationSerializer().fields
+    return list(product(*(list(fields[name].choices) for name in ATTRIBUTE_FIELDS)))
+
+class Command(BaseCommand):
+    help = 'Generate and upload every avatar combination that is not stored yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Parallel generations')
+        parser.add_argument('--retries', type=int, default=3, help='Attempts per avatar after the first')
+        parser.add_argument('--backoff', type=float, default=2.0, help='Base backoff in seconds')
+        parser.add_argument('--batch-size', type=int, default=20, help='Images uploaded per storage batch')
+        parser.add_argument('--fake', action='store_true', help='Use the offline fake generator')
+        parser.add_argument('--dry-run', action='store_true', help='Only report missing avatars')
+
+    def handle(self, *args, **options):
+        generator = FakeAvatarGenerator() if options['fake'] else None
+        service = AvatarGenerationService(generator=generator)
+        self.retries = options['retries']
+        self.backoff = options['backoff']
+
+        # Already stored avatars are skipped, so an interrupted run resumes
+        # where it stopped
+        combinations = attribute_combinations()
+        missing = [
+            attrs for attrs in combinations
+            if not service.get_cached_avatar_url(avatar_attributes_key(*attrs))
+        ]
+        self.stdout.write(f'{len(combinations) - len(missing)} of {len(combinations)} avatars already stored')
+        if options['dry_run'] or not missing:
+            return
+
+        generated = 0
+        failed = []
+        pending = []
+
+        def flush():
+            nonlocal generated
+            urls = service.storage.save_many(
+                (avatar_blob_path(avatar_attributes_key(*attrs)), image_bytes) for attrs, image_bytes in pending
+            )
+            for (attrs, _), url in zip(pending, urls):
+                if url:
+                    generated += 1
+                    self.stdout.write(f"Generated {'/'.join(attrs)} ({generated}/{len(missing)})")
+                else:
+                    failed.append(attrs)
+                    self.stderr.write(f"Failed to upload {'/'.join(attrs)}")
+            pending.clear()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            futures = {executor.submit(self.generate_with_retry, service, attrs): attrs for attrs in missing}
+            for future in as_completed(futures):
+                attrs = futures[future]
+                image_bytes = future.result()
+                if image_bytes:
+                    pending.append((attrs, image_bytes))
+                    if len(pending) >= options['batch_size']:
+                        flush()
+                else:
+                    failed.append(attrs)
+                    self.stderr.write(f"Failed to generate {'/'.join(attrs)}")
+            flush()
+
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'Generated {generated} avatars, {len(failed)} failed; rerun to retry them'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Generated {generated} avatars'))
+
+    def generate_with_retry(self, service, attrs):
+        prompt = service.generate_avatar_prompt(*attrs)
+        for attempt in range(self.retries + 1):
+            image_bytes = service.generate_avatar_image(prompt)
+            if image_bytes:
+                return image_bytes
+            if attempt < self.retries:
+                # Exponential backoff with jitter so workers do not retry in lockstep
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        return None
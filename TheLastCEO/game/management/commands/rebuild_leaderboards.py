@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from game import leaderboard
+from game.db_router import read_only
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis leaderboards from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=leaderboard.PERIODS,
+            action='append',
+            help='Board to rebuild (repeatable, default: all)'
+        )
+
+    @read_only
+    def handle(self, *args, **options):
+        for period in options['period'] or leaderboard.PERIODS:
+            count = leaderboard.rebuild(period)
+            self.stdout.write(f'Rebuilt {period} leaderboard with {count} entries')
+
+        self.stdout.write(self.style.SUCCESS('Leaderboards rebuilt'))
@@ -0,0 +1,44 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+from game.models import GameSession, Player
+
+def counted(players):
+    """Per-session count subquery over `players`, for GameSession updates"""
+    return Coalesce(Subquery(
+        players.filter(session=OuterRef('pk')).order_by().values('session').annotate(
+            n=Count('id')
+        ).values('n'),
+        output_field=IntegerField()
+    ), Value(0))
+
+class Command(BaseCommand):
+    help = 'Repair GameSession.player_count/alive_count drift from the Player rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted sessions')
+
+    def handle(self, *args, **options):
+        drifted = GameSession.objects.annotate(
+            actual_players=Count('players'),
+            actual_alive=Count('players', filter=Q(players__is_alive=True))
+        ).exclude(
+            player_count=F('actual_players'), alive_count=F('actual_alive')
+        ).values_list('pk', 'session_id', 'player_count', 'actual_players', 'alive_count', 'actual_alive')
+
+        ids = []
+        for pk, session_id, player_count, actual_players, alive_count, actual_alive in drifted:
+            ids.append(pk)
+            self.stdout.write(
+                f'{session_id}: players {player_count} -> {actual_players}, alive {alive_count} -> {actual_alive}'
+            )
+        if options['dry_run'] or not ids:
+            self.stdout.write(self.style.SUCCESS(f'{len(ids)} sessions drifted'))
+            return
+
+        # Recounted inside the UPDATE so joins since the scan are not lost
+        GameSession.objects.filter(pk__in=ids).update(
+            player_count=counted(Player.objects.all()),
+            alive_count=counted(Player.objects.filter(is_alive=True))
+        )
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(ids)} sessions'))
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+from game.ledger import invalidate_user_caches
+from game.models import BalanceTransaction, User
+
+def ledger_total():
+    """Per-user ledger sum subquery, for User updates"""
+    return Coalesce(Subquery(
+        BalanceTransaction.objects.filter(user=OuterRef('pk')).order_by().values('user').annotate(
+            total=Sum('amount')
+        ).values('total'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    ), Value(Decimal('0')))
+
+class Command(BaseCommand):
+    help = 'Recompute User.balance from the BalanceTransaction ledger and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users checked per query')
+        parser.add_argument('--fix', action='store_true', help='Reset drifted balances to their ledger sum')
+
+    def handle(self, *args, **options):
+        checked = 0
+        drifted = 0
+        last_id = 0
+        while True:
+            balances = dict(User.objects.filter(pk__gt=last_id).order_by('pk').values_list(
+                'pk', 'balance'
+            )[:options['chunk_size']])
+            if not balances:
+                break
+            last_id = max(balances)
+            checked += len(balances)
+
+            totals = dict(BalanceTransaction.objects.filter(user_id__in=list(balances)).order_by().values(
+                'user_id'
+            ).annotate(total=Sum('amount')).values_list('user_id', 'total'))
+
+            ids = []
+            for user_id, balance in balances.items():
+                total = totals.get(user_id, Decimal('0'))
+                if balance != total:
+                    ids.append(user_id)
+                    self.stdout.write(f'User {user_id}: balance {balance}, ledger {total}')
+            drifted += len(ids)
+
+            if options['fix'] and ids:
+                # Summed inside the UPDATE so postings since the scan are kept
+                User.objects.filter(pk__in=ids).update(balance=ledger_total())
+                for user_id in ids:
+                    invalidate_user_caches(user_id)
+
+        if drifted and options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, fixed {drifted}'))
+        elif drifted:
+            self.stdout.write(self.style.WARNING(f'Checked {checked} users, {drifted} drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, all balances match'))
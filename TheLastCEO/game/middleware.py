@@ -0,0 +1,96 @@
+from urllib.parse import parse_qs
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .db_pool import db_sync_to_async
+
+# Clients that cannot set query strings may send the token as the second
+# entry of ``Sec-WebSocket-Protocol``: ``["access_token", "<jwt>"]``.
+TOKEN_SUBPROTOCOL = 'access_token'
+
+def user_cache_key(user_id):
+    return f'ws_auth_user:{user_id}'
+
+def get_token_from_scope(scope):
+    """Extract the raw access token from the query string or subprotocols"""
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = query.get('token')
+    if token:
+        return token[0]
+
+    subprotocols = scope.get('subprotocols') or []
+    if TOKEN_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(TOKEN_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1]
+    return None
+
+def cached_user_fields(User):
+    """Columns kept in the auth cache; the password hash never leaves the database"""
+    return [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+def load_user(user_id):
+    """
+    User for a token's user id from the auth cache, loading it on a miss.
+    The cache holds a row of field values, not the pickled model, and the
+    returned user has its password deferred.
+    """
+    User = get_user_model()
+    names = cached_user_fields(User)
+    key = user_cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        try:
+            values = User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).values_list(*names).get()
+        except User.DoesNotExist:
+            return None
+        cache.set(key, values, settings.WS_AUTH_USER_CACHE_TIMEOUT)
+    return User.from_db(DEFAULT_DB_ALIAS, names, values)
+
+_load_user = db_sync_to_async(load_user)
+
+async def get_user_for_token(raw_token):
+    """
+    Validate an access token and resolve its user, hitting the DB only on a
+    cache miss. The cache is read inside the executor call too, since with
+    the Redis backend a cache.get on the event loop blocks it.
+    """
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return AnonymousUser()
+
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return AnonymousUser()
+
+    user = await _load_user(user_id)
+    if user is None:
+        return AnonymousUser()
+
+    if not user.is_active:
+        return AnonymousUser()
+    return user
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populates scope["user"] from a simplejwt access token instead of a Django session.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token = get_token_from_scope(scope)
+        if raw_token:
+            scope['user'] = await get_user_for_token(raw_token)
+        else:
+            scope['user'] = AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
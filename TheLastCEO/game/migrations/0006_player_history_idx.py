@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_remove_honeycomb_stage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['user', '-joined_at', '-id', 'session', 'player_number', 'is_alive', 'elimination_stage', 'final_prize'], name='player_history_idx'),
+        ),
+    ]
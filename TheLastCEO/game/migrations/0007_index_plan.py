@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def dedupe_before_constraints(apps, schema_editor):
+    """
+    The (session, player_number) uniqueness was never applied, and nothing
+    prevented a repeated answer. Renumber clashing players into free seats and
+    keep only the first answer per (player, question).
+    """
+    Player = apps.get_model('game', 'Player')
+    QuizAnswer = apps.get_model('game', 'QuizAnswer')
+
+    clashes = Player.objects.values('session_id', 'player_number').annotate(
+        n=Count('id')
+    ).filter(n__gt=1)
+    for clash in clashes:
+        taken = set(Player.objects.filter(session_id=clash['session_id']).values_list('player_number', flat=True))
+        duplicates = Player.objects.filter(
+            session_id=clash['session_id'], player_number=clash['player_number']
+        ).order_by('joined_at', 'id')[1:]
+        for player in duplicates:
+            number = max(taken) + 1
+            taken.add(number)
+            player.player_number = number
+            player.save(update_fields=['player_number'])
+
+    repeated = QuizAnswer.objects.values('player_id', 'question_id').annotate(
+        n=Count('id'), first_id=Min('id')
+    ).filter(n__gt=1)
+    for row in repeated:
+        QuizAnswer.objects.filter(
+            player_id=row['player_id'], question_id=row['question_id']
+        ).exclude(id=row['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_player_history_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_before_constraints, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='player',
+            unique_together={('session', 'user'), ('session', 'player_number')},
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status'], name='session_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(condition=models.Q(('status__in', ['waiting', 'lobby'])), fields=['created_at'], name='session_joinable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['session', 'is_alive'], name='player_session_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizanswer',
+            index=models.Index(fields=['session', 'question'], name='quiz_answer_session_q_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizanswer',
+            constraint=models.UniqueConstraint(fields=('player', 'question'), name='quiz_answer_player_question_uniq'),
+        ),
+    ]
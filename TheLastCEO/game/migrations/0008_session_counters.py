@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    Player = apps.get_model('game', 'Player')
+
+    def counted(players):
+        return Coalesce(Subquery(
+            players.filter(session=OuterRef('pk')).order_by().values('session').annotate(
+                n=Count('id')
+            ).values('n'),
+            output_field=IntegerField()
+        ), Value(0))
+
+    GameSession.objects.update(
+        player_count=counted(Player.objects.all()),
+        alive_count=counted(Player.objects.filter(is_alive=True))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_index_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='alive_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='player_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_session_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('zstd', 'Zstandard'), ('zlib', 'zlib')], max_length=10)),
+                ('data', models.BinaryField()),
+                ('raw_size', models.IntegerField()),
+                ('quiz_answer_count', models.IntegerField(default=0)),
+                ('chat_message_count', models.IntegerField(default=0)),
+                ('movement_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='game.gamesession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 22:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_ledgers(apps, schema_editor):
+    """One opening row per existing user at their current balance"""
+    User = apps.get_model('game', 'User')
+    BalanceTransaction = apps.get_model('game', 'BalanceTransaction')
+    users = User.objects.order_by('pk').values_list('pk', 'balance')
+    batch = []
+    for user_id, balance in users.iterator(chunk_size=2000):
+        batch.append(BalanceTransaction(
+            user_id=user_id, amount=balance, kind='opening', idempotency_key=f'opening:{user_id}'
+        ))
+        if len(batch) >= 2000:
+            BalanceTransaction.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    BalanceTransaction.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_session_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('entry_fee', 'Entry Fee'), ('payout', 'Payout'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='balance_transactions', to='game.gamesession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'amount'], name='balance_tx_user_amount_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
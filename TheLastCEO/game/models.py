@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -68,6 +69,22 @@ class User(AbstractUser):
     USERNAME_FIELD = 'nickname'
     REQUIRED_FIELDS = ['email']
     objects = CustomUserManager()
+    
+    # Only changed through game.ledger with F() updates
+    LEDGER_FIELDS = ('balance', 'total_earnings', 'total_games_won')
+    
+    def save(self, *args, **kwargs):
+        # request.user may come from the auth cache; a full save() must not
+        # write a stale balance back over concurrent fees and payouts, nor
+        # load the password it was cached without
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LEDGER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
 
 class GameSession(models.Model):
     """Main game session model"""
@@ -91,12 +108,50 @@ class GameSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
+    # Denormalized from Player rows and only ever changed with F() updates;
+    # `manage.py reconcile_session_counters` repairs drift
+    player_count = models.IntegerField(default=0)
+    alive_count = models.IntegerField(default=0)
+    
+    # prize_pool grows with F() updates as entry fees are paid
+    COUNTER_FIELDS = ('player_count', 'alive_count', 'prize_pool')
+    
+    def save(self, *args, **kwargs):
+        # A full save() from an instance loaded before a join or elimination
+        # must not write stale counters back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def get_alive_players(self):
         return self.players.filter(is_alive=True)
     
     def get_eliminated_players(self):
         return self.players.filter(is_alive=False)
+    
+    def eliminate_players(self, players, stage: int) -> int:
+        """Bulk Player.eliminate for a queryset of this session's players"""
+        with transaction.atomic():
+            count = players.filter(session=self, is_alive=True).update(
+                is_alive=False, eliminated_at=timezone.now(), elimination_stage=stage
+            )
+            if count:
+                GameSession.objects.filter(pk=self.pk).update(alive_count=F('alive_count') - count)
+        return count
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='session_status_idx'),
+            # available_games only looks at joinable sessions, a small slice of the table
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status__in=['waiting', 'lobby']),
+                name='session_joinable_idx'
+            ),
+        ]
 
 class Player(models.Model):
     """Player in a specific game session"""
@@ -111,12 +166,44 @@ class Player(models.Model):
     eliminated_at = models.DateTimeField(null=True, blank=True)
     final_prize = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     
+    def eliminate(self, stage: int) -> bool:
+        """
+        Mark the player eliminated at `stage` (1 quiz, 2 red light) and
+        decrement the session's alive_count. Returns False if they were
+        already out, so concurrent eliminations count once.
+        """
+        eliminated_at = timezone.now()
+        with transaction.atomic():
+            updated = Player.objects.filter(pk=self.pk, is_alive=True).update(
+                is_alive=False, eliminated_at=eliminated_at, elimination_stage=stage
+            )
+            if updated:
+                GameSession.objects.filter(pk=self.session_id).update(alive_count=F('alive_count') - 1)
+        if updated:
+            self.is_alive = False
+            self.eliminated_at = eliminated_at
+            self.elimination_stage = stage
+        return bool(updated)
+    
     class Meta:
-        unique_together = ['session', 'player_number']
-        unique_together = ['session', 'user']
+        unique_together = [['session', 'player_number'], ['session', 'user']]
+        indexes = [
+            # Alive/eliminated player lookups within a session
+            models.Index(fields=['session', 'is_alive'], name='player_session_alive_idx'),
+            # Keyset pagination of a user's history on (joined_at, id); the
+            # trailing columns let the history projection skip the heap.
+            models.Index(
+                fields=['user', '-joined_at', '-id', 'session', 'player_number',
+                        'is_alive', 'elimination_stage', 'final_prize'],
+                name='player_history_idx'
+            ),
+        ]
 
 class QuizQuestion(models.Model):
     """Quiz questions for stage 1"""
+    # Stable key of imported questions (manage.py import_quiz_questions);
+    # re-imports update the row in place so its QuizAnswers are kept
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     question_text = models.TextField()
     option_a = models.CharField(max_length=200)
     option_b = models.CharField(max_length=200)
@@ -136,6 +223,16 @@ class QuizAnswer(models.Model):
     is_correct = models.BooleanField()
     answered_at = models.DateTimeField(auto_now_add=True)
     time_taken = models.FloatField()  # seconds
+    
+    class Meta:
+        constraints = [
+            # One answer per player per question; also serves the already-answered check
+            models.UniqueConstraint(fields=['player', 'question'], name='quiz_answer_player_question_uniq'),
+        ]
+        indexes = [
+            # Per-question results of a session
+            models.Index(fields=['session', 'question'], name='quiz_answer_session_q_idx'),
+        ]
 
 class RedLightMovement(models.Model):
     """Track player movements during Red Light Green Light"""
@@ -167,3 +264,45 @@ class GameStatistics(models.Model):
     total_prize_distributed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     average_survival_time = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+class SessionArchive(models.Model):
+    """Compressed JSONL of a finished session's answers, chat and movements (see game.archive)"""
+    CODEC_CHOICES = [
+        ('zstd', 'Zstandard'),
+        ('zlib', 'zlib'),
+    ]
+    
+    session = models.OneToOneField(GameSession, on_delete=models.CASCADE, related_name='archive')
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES)
+    data = models.BinaryField()
+    raw_size = models.IntegerField()  # bytes before compression
+    quiz_answer_count = models.IntegerField(default=0)
+    chat_message_count = models.IntegerField(default=0)
+    movement_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class BalanceTransaction(models.Model):
+    """
+    Append-only ledger of User.balance changes (see game.ledger). A user's
+    balance is the sum of their rows; `manage.py verify_balances` checks it.
+    """
+    KIND_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('entry_fee', 'Entry Fee'),
+        ('payout', 'Payout'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_transactions')
+    session = models.ForeignKey(GameSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='balance_transactions')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # negative for debits
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # e.g. entry_fee:<session_id>:<user_id>; a retried write posts nothing
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Per-user sums when verifying balances
+            models.Index(fields=['user', 'amount'], name='balance_tx_user_amount_idx'),
+        ]
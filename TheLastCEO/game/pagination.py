@@ -0,0 +1,29 @@
+import base64
+import json
+from django.utils.dateparse import parse_datetime
+
+def encode_cursor(*values):
+    """Opaque cursor for a keyset position, e.g. (joined_at, id)"""
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for tampered cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+def decode_datetime_cursor(cursor):
+    """Decode a (datetime, id) cursor"""
+    values = decode_cursor(cursor)
+    if len(values) != 2 or not isinstance(values[1], int):
+        raise ValueError('Invalid cursor')
+    when = parse_datetime(values[0]) if isinstance(values[0], str) else None
+    if when is None:
+        raise ValueError('Invalid cursor')
+    return when, values[1]
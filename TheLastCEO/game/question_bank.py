@@ -0,0 +1,138 @@
+"""
+Streaming import of the quiz question bank.
+
+Rows are read one at a time from CSV (with a header row) or JSONL files and
+upserted in batches keyed on QuizQuestion.external_id, so re-importing a
+question updates it in place and its QuizAnswers are kept. Questions are
+never deleted: with replace=True the ones missing from the input are
+deactivated instead.
+"""
+import csv
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from django.db import transaction
+from . import json_codec
+from .caching import quiz_question_cache
+from .models import QuizQuestion
+
+BATCH_SIZE = 1000
+
+ANSWERS = {'A', 'B', 'C', 'D'}
+REQUIRED_FIELDS = ('external_id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer')
+# Written on conflict; everything but the key
+UPDATE_FIELDS = (
+    'question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_answer', 'difficulty', 'category', 'is_active',
+)
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+MAX_LENGTHS = {
+    field: QuizQuestion._meta.get_field(field).max_length
+    for field in ('external_id', 'option_a', 'option_b', 'option_c', 'option_d', 'category')
+}
+
+class QuestionImportError(ValueError):
+    """An input row that cannot become a QuizQuestion"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+        self.line = line
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[Tuple[int, dict]]:
+    """(line number, row) pairs of a CSV or JSONL file; the format defaults to the extension"""
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    # utf-8-sig drops the byte order mark spreadsheets like to add
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            try:
+                for row in reader:
+                    yield reader.line_num, row
+            except csv.Error as e:
+                raise QuestionImportError(reader.line_num, str(e))
+        else:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json_codec.loads(text)
+                except ValueError as e:
+                    raise QuestionImportError(line, f'invalid JSON: {e}')
+                if not isinstance(row, dict):
+                    raise QuestionImportError(line, 'expected a JSON object')
+                yield line, row
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+def build_question(line: int, row: dict) -> QuizQuestion:
+    """Validate one input row; checked here since a bad row would fail its whole batch in the database"""
+    values = {field: _text(row, field) for field in REQUIRED_FIELDS}
+    missing = [field for field, value in values.items() if not value]
+    if missing:
+        raise QuestionImportError(line, f'missing {", ".join(missing)}')
+
+    values['correct_answer'] = values['correct_answer'].upper()
+    if values['correct_answer'] not in ANSWERS:
+        raise QuestionImportError(line, f"correct_answer must be one of A, B, C, D, not {values['correct_answer']!r}")
+
+    try:
+        values['difficulty'] = int(_text(row, 'difficulty') or 1)
+    except ValueError:
+        raise QuestionImportError(line, f"difficulty must be a number, not {row['difficulty']!r}")
+    if not 1 <= values['difficulty'] <= 5:
+        raise QuestionImportError(line, 'difficulty must be between 1 and 5')
+
+    values['category'] = _text(row, 'category') or 'general'
+    is_active = row.get('is_active')
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in FALSE_VALUES if is_active.strip() else True
+    values['is_active'] = True if is_active is None else bool(is_active)
+
+    for field, max_length in MAX_LENGTHS.items():
+        if len(values[field]) > max_length:
+            raise QuestionImportError(line, f'{field} is longer than {max_length} characters')
+    return QuizQuestion(**values)
+
+def import_questions(rows: Iterable[Tuple[int, dict]], batch_size: int = BATCH_SIZE,
+                     replace: bool = False) -> Dict[str, int]:
+    """
+    Upsert (line, row) pairs in batches of `batch_size`, all in one
+    transaction, so a bad row leaves the bank as it was. With `replace`,
+    questions absent from the input end up inactive.
+
+    Returns counts of rows read, questions created and updated, and the
+    active questions afterwards.
+    """
+    counts = {'read': 0, 'created': 0, 'updated': 0}
+    rows = iter(rows)
+    with transaction.atomic():
+        if replace:
+            # The upserts below reactivate every question the input still has
+            QuizQuestion.objects.filter(is_active=True).update(is_active=False)
+
+        while True:
+            batch = {}
+            for line, row in islice(rows, batch_size):
+                question = build_question(line, row)
+                # A row may only be upserted once per statement; the last copy wins
+                batch[question.external_id] = question
+                counts['read'] += 1
+            if not batch:
+                break
+
+            existing = QuizQuestion.objects.filter(external_id__in=list(batch)).count()
+            QuizQuestion.objects.bulk_create(
+                batch.values(),
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=UPDATE_FIELDS
+            )
+            counts['updated'] += existing
+            counts['created'] += len(batch) - existing
+
+        counts['active'] = QuizQuestion.objects.filter(is_active=True).count()
+        # bulk_create and update() skip the signal that drops the cached pool
+        transaction.on_commit(quiz_question_cache.invalidate_all)
+    return counts
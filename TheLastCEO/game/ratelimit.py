@@ -0,0 +1,180 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from redis.exceptions import RedisError
+from .redis_client import get_redis, get_async_redis
+from . import json_codec
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Token bucket kept in a Redis hash; TIME keeps every worker on the server clock.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry_after = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_rate(rate):
+    """Turn '5/s' style rates into tokens per second"""
+    num, period = rate.split('/')
+    return int(num) / PERIODS[period[0]]
+
+class Rule:
+    def __init__(self, scope, rate, burst=None):
+        self.scope = scope
+        self.rate = parse_rate(rate)
+        self.burst = burst or max(1, int(self.rate))
+
+def get_rule(scope):
+    config = settings.RATE_LIMITS.get(scope)
+    if config is None:
+        return None
+    return Rule(scope, config['rate'], config.get('burst'))
+
+class TokenBucket:
+    """In-process token bucket"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, requested=1):
+        """Take tokens if available, returning (allowed, retry_after)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= requested:
+            self.tokens -= requested
+            return True, 0
+        return False, (requested - self.tokens) / self.rate
+
+class LocalBuckets:
+    """Bounded LRU of token buckets for this process"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, rule, requested=1):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(rule.rate, rule.burst)
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_size:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket.consume(requested)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+local_buckets = LocalBuckets()
+
+# After a Redis failure we stay on the local buckets for a while instead of
+# paying a connect timeout on every frame.
+REDIS_RETRY_INTERVAL = 10
+_redis_down_until = 0
+
+def _use_redis(shared):
+    return shared and settings.RATE_LIMIT_BACKEND == 'redis' and time.monotonic() >= _redis_down_until
+
+def _mark_redis_down(error):
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_INTERVAL
+    logger.warning(f"Rate limit Redis unavailable, using local buckets: {str(error)}")
+
+def _redis_key(rule, ident):
+    return f'ratelimit:{rule.scope}:{ident}'
+
+def check(scope, ident, shared=True, requested=1):
+    """
+    Consume from the bucket for (scope, ident) and return (allowed, retry_after).
+
+    The local bucket is always checked first so a single noisy client is
+    rejected without a network round-trip; shared limits then go through Redis
+    so they hold across workers.
+    """
+    rule = get_rule(scope)
+    if rule is None:
+        return True, 0
+    allowed, retry_after = local_buckets.consume(f'{scope}:{ident}', rule, requested)
+    if not allowed or not _use_redis(shared):
+        return allowed, retry_after
+    try:
+        script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, retry_after = script(keys=[_redis_key(rule, ident)], args=[rule.rate, rule.burst, requested])
+    except RedisError as e:
+        _mark_redis_down(e)
+        return True, 0
+    return bool(allowed), float(retry_after)
+
+async def acheck(scope, ident, shared=True, requested=1):
+    """Async counterpart of check() for consumers"""
+    rule = get_rule(scope)
+    if rule is None:
+        return True, 0
+    allowed, retry_after = local_buckets.consume(f'{scope}:{ident}', rule, requested)
+    if not allowed or not _use_redis(shared):
+        return allowed, retry_after
+    try:
+        script = get_async_redis().register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, retry_after = await script(keys=[_redis_key(rule, ident)], args=[rule.rate, rule.burst, requested])
+    except (RedisError, OSError) as e:
+        _mark_redis_down(e)
+        return True, 0
+    return bool(allowed), float(retry_after)
+
+def rate_limited(scope):
+    """
+    Drop GameConsumer frames over the limit for `scope`.
+
+    Checks a per-connection bucket (local only, a socket lives in one process)
+    and a per-user bucket (shared through Redis), then tells the client it was
+    limited instead of running the handler.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, data):
+            allowed, retry_after = await acheck(scope, f'conn:{self.channel_name}', shared=False)
+            if allowed and self.user.is_authenticated:
+                allowed, retry_after = await acheck(scope, f'user:{self.user.pk}')
+            if not allowed:
+                await self.send(text_data=json_codec.dumps({
+                    'type': 'rate_limited',
+                    'data': {
+                        'message_type': scope,
+                        'retry_after': round(retry_after, 3)
+                    }
+                }))
+                return
+            return await handler(self, data)
+        return wrapper
+    return decorator
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+import weakref
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_redis():
+    """Shared synchronous Redis client for REDIS_URL"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT
+                )
+    return _client
+
+def get_async_redis():
+    """asyncio Redis client for REDIS_URL, one per event loop since pools are loop-bound"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT
+        )
+        _async_clients[loop] = client
+    return client
@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from .models import User, GameSession, Player, ChatMessage
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -20,16 +19,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class UserLoginSerializer(serializers.Serializer):
+class UserCredentialsSerializer(serializers.Serializer):
     nickname = serializers.CharField()
     password = serializers.CharField()
-    
-    def validate(self, data):
-        user = authenticate(username=data['nickname'], password=data['password'])
-        if not user:
-            raise serializers.ValidationError("Invalid credentials")
-        data['user'] = user
-        return data
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -37,7 +29,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ['id', 'nickname', 'balance', 'avatar_url', 'avatar_headwear', 'avatar_accessory',
                  'avatar_gender', 'avatar_favorite_color', 'avatar_generation_in_progress', 
                  'total_games_played', 'total_games_won', 'total_earnings', 'created_at']
-        read_only_fields = ['id', 'nickname', 'total_games_played', 'total_games_won', 
+        read_only_fields = ['id', 'nickname', 'balance', 'total_games_played', 'total_games_won', 
                            'total_earnings', 'created_at', 'avatar_url', 'avatar_generation_in_progress']
 
 class AvatarCustomizationSerializer(serializers.Serializer):
@@ -69,15 +61,13 @@ class AvatarCustomizationSerializer(serializers.Serializer):
     ])
 
 class GameSessionSerializer(serializers.ModelSerializer):
-    alive_players_count = serializers.SerializerMethodField()
+    alive_players_count = serializers.IntegerField(source='alive_count', read_only=True)
     
     class Meta:
         model = GameSession
         fields = ['session_id', 'status', 'max_players', 'entry_fee', 'prize_pool', 
-                 'current_stage', 'alive_players_count', 'created_at']
-    
-    def get_alive_players_count(self, obj):
-        return obj.get_alive_players().count()
+                 'current_stage', 'player_count', 'alive_players_count', 'created_at']
+        read_only_fields = ['player_count']
 
 class PlayerSerializer(serializers.ModelSerializer):
     nickname = serializers.CharField(source='user.nickname', read_only=True)
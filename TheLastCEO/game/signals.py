@@ -0,0 +1,46 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .caching import quiz_question_cache, session_cache
+from .ledger import invalidate_user_caches, record_opening_balance
+from .models import User, GameSession, Player, QuizQuestion
+from .sprites import get_session_atlas, schedule_atlas_build
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    """Drop the cached auth user and profile so the next request sees fresh data"""
+    invalidate_user_caches(instance.pk)
+
+@receiver(post_save, sender=User)
+def open_balance_ledger(sender, instance, created, **kwargs):
+    if created:
+        record_opening_balance(instance)
+
+@receiver([post_save, post_delete], sender=GameSession)
+def invalidate_session_metadata(sender, instance, **kwargs):
+    session_cache.invalidate(str(instance.session_id))
+
+@receiver([post_save, post_delete], sender=QuizQuestion)
+def invalidate_quiz_questions(sender, instance, **kwargs):
+    quiz_question_cache.invalidate_all()
+
+@receiver(post_save, sender=GameSession)
+def build_atlas_on_lobby(sender, instance, **kwargs):
+    """Compose the avatar sprite atlas once when a session reaches the lobby"""
+    if instance.status == 'lobby' and get_session_atlas(instance.session_id) is None:
+        schedule_atlas_build(instance.session_id)
+
+@receiver(post_save, sender=Player)
+def count_joined_player(sender, instance, created, **kwargs):
+    if created:
+        GameSession.objects.filter(pk=instance.session_id).update(
+            player_count=F('player_count') + 1,
+            alive_count=F('alive_count') + (1 if instance.is_alive else 0)
+        )
+
+@receiver(post_delete, sender=Player)
+def count_removed_player(sender, instance, **kwargs):
+    GameSession.objects.filter(pk=instance.session_id).update(
+        player_count=F('player_count') - 1,
+        alive_count=F('alive_count') - (1 if instance.is_alive else 0)
+    )
@@ -0,0 +1,115 @@
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+from urllib.request import urlopen
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .avatar_storage import get_avatar_storage
+from .models import GameSession
+import logging
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 32
+ATLAS_COLUMNS = 10
+FETCH_WORKERS = 8
+ATLAS_BUILD_DELAY = 2  # seconds
+
+def atlas_path(session_id, image_bytes: bytes) -> str:
+    # Content hash in the name: nginx serves /media/ with a 30 day expiry
+    digest = hashlib.sha256(image_bytes).hexdigest()[:12]
+    return f"atlases/{session_id}-{digest}.png"
+
+def atlas_cache_key(session_id) -> str:
+    return f"avatar_atlas:{session_id}"
+
+def tile_offset(player_number: int):
+    """Pixel offset of a player's tile; tiles are laid out by player number"""
+    index = player_number - 1
+    return [(index % ATLAS_COLUMNS) * TILE_SIZE, (index // ATLAS_COLUMNS) * TILE_SIZE]
+
+def load_avatar_bytes(avatar_url: str) -> Optional[bytes]:
+    """Read an avatar from our storage when we host it, otherwise over HTTP"""
+    storage = get_avatar_storage()
+    prefix = storage.url('')
+    try:
+        if avatar_url.startswith(prefix):
+            return storage.open(avatar_url[len(prefix):])
+        with urlopen(avatar_url, timeout=settings.AVATAR_FETCH_TIMEOUT) as response:
+            return response.read()
+    except Exception as e:
+        logger.error(f"Error loading avatar {avatar_url} for atlas: {str(e)}")
+        return None
+
+def build_session_atlas(session_id) -> Optional[dict]:
+    """
+    Compose every player's avatar into one PNG and cache its index.
+
+    The index maps player_number to the [x, y] pixel offset of a
+    TILE_SIZE square, so clients fetch one image instead of one per player.
+    """
+    session = GameSession.objects.get(session_id=session_id)
+    players = list(session.players.exclude(user__avatar_url__isnull=True).exclude(
+        user__avatar_url=''
+    ).values_list('player_number', 'user__avatar_url'))
+    if not players:
+        return None
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        images = list(executor.map(load_avatar_bytes, [url for _, url in players]))
+
+    rows = math.ceil(max(session.max_players, max(number for number, _ in players)) / ATLAS_COLUMNS)
+    atlas = Image.new('RGBA', (ATLAS_COLUMNS * TILE_SIZE, rows * TILE_SIZE), (0, 0, 0, 0))
+    tiles = {}
+    for (player_number, _), image_bytes in zip(players, images):
+        if not image_bytes:
+            continue
+        try:
+            tile = Image.open(BytesIO(image_bytes)).convert('RGBA')
+        except Exception as e:
+            logger.error(f"Unreadable avatar for player {player_number}: {str(e)}")
+            continue
+        if tile.size != (TILE_SIZE, TILE_SIZE):
+            tile = tile.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.NEAREST)
+        offset = tile_offset(player_number)
+        atlas.paste(tile, tuple(offset))
+        tiles[str(player_number)] = offset
+
+    output = BytesIO()
+    atlas.save(output, format='PNG', optimize=True)
+    image_bytes = output.getvalue()
+    url = get_avatar_storage().save(atlas_path(session.session_id, image_bytes), image_bytes)
+    index = {
+        'url': url,
+        'tile_size': TILE_SIZE,
+        'columns': ATLAS_COLUMNS,
+        'tiles': tiles
+    }
+    cache.set(atlas_cache_key(session.session_id), index, settings.AVATAR_ATLAS_CACHE_TIMEOUT)
+    return index
+
+def atlas_pending_key(session_id) -> str:
+    return f"avatar_atlas_pending:{session_id}"
+
+def enqueue_atlas_build(session_id):
+    """Publish the atlas job; a broker error is logged rather than failing the join that asked for it"""
+    from .tasks import build_avatar_atlas
+    try:
+        build_avatar_atlas.apply_async(args=[str(session_id)], countdown=ATLAS_BUILD_DELAY)
+    except Exception as e:
+        logger.error(f"Error queueing atlas build for session {session_id}: {str(e)}")
+        # Let the next join try again instead of waiting out the debounce
+        cache.delete(atlas_pending_key(session_id))
+
+def schedule_atlas_build(session_id):
+    """Queue an atlas (re)build after commit, collapsing bursts of joins into one job"""
+    if cache.add(atlas_pending_key(session_id), True, ATLAS_BUILD_DELAY):
+        transaction.on_commit(lambda: enqueue_atlas_build(session_id))
+
+def get_session_atlas(session_id) -> Optional[dict]:
+    """Cached atlas index for a session, or None if it has not been built"""
+    return cache.get(atlas_cache_key(session_id))
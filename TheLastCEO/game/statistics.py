@@ -0,0 +1,64 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Avg, Count, DecimalField, DurationField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import GameSession, GameStatistics, Player
+
+def _aggregates():
+    """Per-session GameStatistics values as aggregates over Player rows"""
+    return {
+        'total_players': Count('id'),
+        'quiz_eliminations': Count('id', filter=Q(elimination_stage=1)),
+        'red_light_eliminations': Count('id', filter=Q(elimination_stage=2)),
+        'winners_count': Count('id', filter=Q(is_alive=True)),
+        'total_prize_distributed': Coalesce(
+            Sum('final_prize'), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        # Survivors count until the session finished
+        'average_survival': Avg(ExpressionWrapper(
+            Coalesce('eliminated_at', 'session__finished_at') - F('session__started_at'),
+            output_field=DurationField()
+        )),
+    }
+
+def _statistics_fields(row):
+    survival = row.pop('average_survival', None)
+    if isinstance(survival, timedelta):
+        survival = survival.total_seconds()
+    row['average_survival_time'] = survival or 0
+    return row
+
+def update_statistics(session: GameSession) -> GameStatistics:
+    """Compute a session's GameStatistics from its Player rows in one aggregate query"""
+    row = Player.objects.filter(session=session).aggregate(**_aggregates())
+    statistics, _ = GameStatistics.objects.update_or_create(session=session, defaults=_statistics_fields(row))
+    return statistics
+
+def backfill_statistics(chunk_size=500):
+    """
+    Create GameStatistics for finished sessions that have none, one grouped
+    aggregate query and one bulk insert per chunk of sessions. Yields the
+    number of sessions filled per chunk.
+    """
+    last_id = 0
+    while True:
+        session_ids = list(GameSession.objects.filter(
+            status='finished', statistics__isnull=True, id__gt=last_id
+        ).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not session_ids:
+            return
+        last_id = session_ids[-1]
+
+        rows = {
+            row.pop('session_id'): _statistics_fields(row)
+            for row in Player.objects.filter(session_id__in=session_ids).order_by().values(
+                'session_id'
+            ).annotate(**_aggregates())
+        }
+        empty = {'total_players': 0, 'average_survival_time': 0}
+        GameStatistics.objects.bulk_create([
+            GameStatistics(session_id=session_id, **rows.get(session_id, empty))
+            for session_id in session_ids
+        ], ignore_conflicts=True)
+        yield len(session_ids)
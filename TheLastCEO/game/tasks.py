@@ -0,0 +1,89 @@
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from .avatar_service import get_avatar_service
+from .ledger import invalidate_user_caches
+from .models import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+def notify_user(user_id, event_type, payload):
+    """Push an event to every socket the user has open"""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            user_group_name(user_id),
+            {'type': event_type, 'data': payload}
+        )
+    except Exception as e:
+        logger.error(f"Error notifying user {user_id} of {event_type}: {str(e)}")
+
+def enqueue_avatar(user_id, headwear, accessory, gender, favorite_color):
+    """
+    Queue generate_avatar, run on commit. If the broker refuses the job the
+    user's in-progress flag is cleared and their sockets get avatar_failed,
+    since nothing else would ever end it.
+    """
+    try:
+        generate_avatar.delay(user_id, headwear, accessory, gender, favorite_color)
+    except Exception as e:
+        logger.error(f"Error queueing avatar generation for user {user_id}: {str(e)}")
+        # Unless the user customized again meanwhile and that job owns the flag
+        cleared = User.objects.filter(
+            pk=user_id,
+            avatar_headwear=headwear,
+            avatar_accessory=accessory,
+            avatar_gender=gender,
+            avatar_favorite_color=favorite_color
+        ).update(avatar_generation_in_progress=False)
+        if cleared:
+            # update() skips post_save
+            invalidate_user_caches(user_id)
+            notify_user(user_id, 'avatar_failed', {'error': 'Failed to generate avatar'})
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def generate_avatar(self, user_id, headwear, accessory, gender, favorite_color):
+    """Generate an avatar in the background and tell the user's sockets when it is ready"""
+    attributes = (headwear, accessory, gender, favorite_color)
+    success, avatar_url = get_avatar_service().generate_and_upload_avatar(user_id, *attributes)
+    if not success and self.request.retries < self.max_retries:
+        raise self.retry()
+
+    try:
+        user = User.objects.get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+    current = (user.avatar_headwear, user.avatar_accessory, user.avatar_gender, user.avatar_favorite_color)
+    if current != attributes:
+        # The user customized again meanwhile; the newer job owns the result
+        return None
+
+    user.avatar_generation_in_progress = False
+    if success:
+        user.avatar_url = avatar_url
+        user.save(update_fields=['avatar_url', 'avatar_generation_in_progress'])
+        notify_user(user_id, 'avatar_ready', {'avatar_url': avatar_url})
+    else:
+        user.save(update_fields=['avatar_generation_in_progress'])
+        notify_user(user_id, 'avatar_failed', {'error': 'Failed to generate avatar'})
+    return avatar_url
+
+@shared_task
+def build_avatar_atlas(session_id):
+    """Compose the session's sprite atlas and announce it to the room"""
+    from .sprites import atlas_pending_key, build_session_atlas
+    cache.delete(atlas_pending_key(session_id))
+    atlas = build_session_atlas(session_id)
+    if atlas:
+        try:
+            async_to_sync(get_channel_layer().group_send)(
+                f'game_{session_id}',
+                {'type': 'avatar_atlas', 'data': atlas}
+            )
+        except Exception as e:
+            logger.error(f"Error announcing avatar atlas for {session_id}: {str(e)}")
+    return atlas
@@ -1,11 +1,83 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import product
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from .models import User, GameSession, Player, QuizQuestion, QuizAnswer
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .models import (
+    User, GameSession, Player, QuizQuestion, QuizAnswer, ChatMessage, GameStatistics,
+    RedLightMovement, SessionArchive
+)
+from .serializers import AvatarCustomizationSerializer
+from . import json_codec, leaderboard, ledger
+from .archive import archive_session
+from .avatar_service import (
+    AvatarRequestCoalescer, FakeAvatarGenerator, avatar_attributes_key, avatar_url_cache_key,
+    get_avatar_service
+)
+from .avatar_storage import get_avatar_storage
+from .caching import (
+    CacheNamespace, cache_stats, get_quiz_question_pool, local_cache, profile_cache, reset_cache_stats
+)
+from .consumers import GameConsumer
+from .db_pool import (
+    ConnectionPool, PooledDatabaseSyncToAsync, PoolTimeout, db_sync_to_async, executor_stats
+)
+from .db_router import ReplicaRoutingMiddleware, read_only
+from .json_codec import FastJSONRenderer, orjson
+from .middleware import JWTAuthMiddleware, user_cache_key
+from .ratelimit import check, local_buckets, rate_limited
+from .redis_client import get_redis
+from .sprites import TILE_SIZE, atlas_pending_key, get_session_atlas
+from .statistics import update_statistics
+from .tasks import build_avatar_atlas, generate_avatar, user_group_name
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+import uuid
 
 # Create your tests here.
 
+class ReplicaOnPrimaryMixin:
+    """Serve the replica alias from the primary's connection so read-only views see test data"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if settings.DATABASE_REPLICA:
+            replica = connections[settings.DATABASE_REPLICA]
+            connections[settings.DATABASE_REPLICA] = connections['default']
+            cls.addClassCleanup(connections.__setitem__, settings.DATABASE_REPLICA, replica)
+
+class CacheResetMixin:
+    """Empty the caches and rate-limit buckets before each test; they outlive the test transaction"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        local_cache.clear()
+        local_buckets.clear()
+
 class AvatarCustomizationTest(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -34,8 +106,6 @@ class AvatarCustomizationTest(APITestCase):
     
     def test_avatar_customization_serializer(self):
         """Test that the avatar customization serializer validates correctly"""
-        from .serializers import AvatarCustomizationSerializer
-        
         valid_data = {
             'headwear': 'crown',
             'accessory': 'glasses',
@@ -346,3 +416,1308 @@ class QuizAPITest(APITestCase):
         
         response = self.client.get('/quiz/questions/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+# Thread-sensitive DB calls run on the test thread and see its transaction
+@override_settings(DB_EXECUTOR_WORKERS=0)
+class WebSocketJWTAuthTest(CacheResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='wsuser',
+            email='ws@example.com',
+            password='testpass123'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def resolve_user(self, scope):
+        captured = {}
+
+        async def inner(scope, receive, send):
+            captured['user'] = scope['user']
+
+        async_to_sync(JWTAuthMiddleware(inner))(scope, None, None)
+        return captured['user']
+
+    def test_token_from_query_string(self):
+        """Test that a valid access token in the query string authenticates the socket"""
+        user = self.resolve_user({'type': 'websocket', 'query_string': f'token={self.token}'.encode()})
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_token_from_subprotocol(self):
+        """Test that the token can be sent through Sec-WebSocket-Protocol"""
+        user = self.resolve_user({'type': 'websocket', 'subprotocols': ['access_token', self.token]})
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_invalid_token_is_anonymous(self):
+        """Test that a bad or missing token results in an anonymous user"""
+        user = self.resolve_user({'type': 'websocket', 'query_string': b'token=garbage'})
+        self.assertFalse(user.is_authenticated)
+        user = self.resolve_user({'type': 'websocket'})
+        self.assertFalse(user.is_authenticated)
+
+    def test_repeat_connects_skip_database(self):
+        """Test that once cached, resolving the user costs no queries"""
+        scope = {'type': 'websocket', 'query_string': f'token={self.token}'.encode()}
+        self.resolve_user(scope)
+        with self.assertNumQueries(0):
+            user = self.resolve_user(scope)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_user_save_invalidates_cache(self):
+        """Test that saving the user drops the cached copy"""
+        scope = {'type': 'websocket', 'query_string': f'token={self.token}'.encode()}
+        self.resolve_user(scope)
+        self.user.is_active = False
+        self.user.save()
+        user = self.resolve_user(scope)
+        self.assertFalse(user.is_authenticated)
+
+    def test_cache_holds_no_password_hash(self):
+        """Test that the auth cache stores field values without the password hash"""
+        scope = {'type': 'websocket', 'query_string': f'token={self.token}'.encode()}
+        self.resolve_user(scope)
+        cached = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn(self.user.password, cached)
+        user = self.resolve_user(scope)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(user.nickname, 'wsuser')
+
+class AuthEndpointsTest(CacheResetMixin, APITestCase):
+    def test_register_and_login(self):
+        """Test that registration and login hash passwords off the request path"""
+        response = self.client.post('/auth/register/', {
+            'nickname': 'newplayer',
+            'email': 'new@example.com',
+            'password': 'testpass123',
+            'confirm_password': 'testpass123'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('access', response.json())
+        self.assertTrue(User.objects.get(nickname='newplayer').check_password('testpass123'))
+
+        response = self.client.post('/auth/login/', {
+            'nickname': 'newplayer',
+            'password': 'testpass123'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['nickname'], 'newplayer')
+
+    def test_login_rejects_bad_credentials(self):
+        """Test that wrong passwords and unknown nicknames are rejected alike"""
+        User.objects.create_user(nickname='player', email='p@example.com', password='testpass123')
+        for nickname, password in [('player', 'wrongpass'), ('nobody', 'testpass123')]:
+            response = self.client.post('/auth/login/', {
+                'nickname': nickname,
+                'password': password
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {'non_field_errors': ['Invalid credentials']})
+
+    def test_register_returns_429_when_hashing_queue_is_full(self):
+        """Test that registration sheds load instead of queueing unboundedly"""
+        with override_settings(PASSWORD_HASHING_MAX_PENDING=0):
+            response = self.client.post('/auth/register/', {
+                'nickname': 'burst',
+                'email': 'burst@example.com',
+                'password': 'testpass123',
+                'confirm_password': 'testpass123'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(User.objects.filter(nickname='burst').exists())
+
+    @override_settings(AVATAR_STORAGE_BACKEND='game.avatar_storage.InMemoryAvatarStorage')
+    def test_login_time_survives_cached_user_save(self):
+        """Test that login drops the cached user so a later save keeps last_login and the password"""
+        user = User.objects.create_user(nickname='cached', email='cached@example.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.assertEqual(self.client.get('/profile/').status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/auth/login/', {'nickname': 'cached', 'password': 'testpass123'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        last_login = User.objects.get(pk=user.pk).last_login
+        self.assertIsNotNone(last_login)
+
+        response = self.client.post('/avatar/customize/', {
+            'headwear': 'crown', 'accessory': 'glasses', 'gender': 'male', 'favorite_color': 'red'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        user.refresh_from_db()
+        self.assertEqual(user.last_login, last_login)
+        self.assertEqual(user.avatar_headwear, 'crown')
+        self.assertTrue(user.check_password('testpass123'))
+
+@override_settings(RATE_LIMIT_BACKEND='local', RATE_LIMITS={
+    'chat_message': {'rate': '1/m', 'burst': 2},
+    'join_game': {'rate': '1/m', 'burst': 1},
+})
+class RateLimitTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_bucket_allows_burst_then_limits(self):
+        """Test that a bucket allows its burst and then reports a retry delay"""
+        self.assertTrue(check('chat_message', 'user:1')[0])
+        self.assertTrue(check('chat_message', 'user:1')[0])
+        allowed, retry_after = check('chat_message', 'user:1')
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+        # Other identities have their own bucket, unknown scopes are unlimited
+        self.assertTrue(check('chat_message', 'user:2')[0])
+        self.assertTrue(check('unknown_scope', 'user:1')[0])
+
+    def test_join_game_is_throttled(self):
+        """Test that join_game answers 429 once the user's bucket is empty"""
+        self.client.force_authenticate(user=self.user)
+        first = GameSession.objects.create(entry_fee=0)
+        second = GameSession.objects.create(entry_fee=0)
+        response = self.client.post(f'/games/{first.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f'/games/{second.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_consumer_handler_is_rate_limited(self):
+        """Test that decorated consumer handlers drop frames over the limit"""
+        sent = []
+        handled = []
+
+        class FakeConsumer:
+            channel_name = 'test.channel'
+            user = self.user
+
+            async def send(self, text_data):
+                sent.append(json.loads(text_data))
+
+            @rate_limited('chat_message')
+            async def handle_chat_message(self, data):
+                handled.append(data)
+
+        consumer = FakeConsumer()
+        for i in range(3):
+            async_to_sync(consumer.handle_chat_message)({'message': i})
+        self.assertEqual(len(handled), 2)
+        self.assertEqual(sent[0]['type'], 'rate_limited')
+        self.assertEqual(sent[0]['data']['message_type'], 'chat_message')
+
+def redis_available():
+    try:
+        return get_redis().ping()
+    except Exception:
+        return False
+
+class LeaderboardKeysTest(TestCase):
+    def test_board_keys(self):
+        """Test that windowed boards are keyed by local day and ISO week"""
+        when = timezone.make_aware(datetime(2024, 1, 3, 12, 0))
+        self.assertEqual(leaderboard.board_key('global', when), 'leaderboard:global')
+        self.assertEqual(leaderboard.board_key('daily', when), 'leaderboard:daily:2024-01-03')
+        self.assertEqual(leaderboard.board_key('weekly', when), 'leaderboard:weekly:2024-W01')
+
+        start, end = leaderboard.window_bounds('weekly', when)
+        self.assertEqual(timezone.localtime(start).date().isoformat(), '2024-01-01')
+        self.assertEqual((end - start).days, 7)
+
+@skipUnless(redis_available(), 'Redis is not available')
+class LeaderboardTest(ReplicaOnPrimaryMixin, APITestCase):
+    def setUp(self):
+        redis = get_redis()
+        for key in redis.scan_iter(f'{leaderboard.KEY_PREFIX}:*'):
+            redis.delete(key)
+        self.users = [
+            User.objects.create_user(nickname=f'player{i}', email=f'p{i}@example.com', password='testpass123')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.users[0])
+
+    def test_payouts_rank_users(self):
+        """Test that incremental payouts are ranked and paginated"""
+        leaderboard.record_payout(self.users[0].id, 100)
+        leaderboard.record_payout(self.users[1].id, 300)
+        leaderboard.record_payout(self.users[0].id, 250)
+
+        response = self.client.get('/leaderboard/', {'period': 'daily', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['nickname'], 'player0')
+        self.assertEqual(response.data['results'][0]['earnings'], 350)
+
+        response = self.client.get('/leaderboard/me/')
+        self.assertEqual(response.data['rank'], 1)
+
+    def test_rebuild_from_database(self):
+        """Test that the global board can be rebuilt from user totals"""
+        User.objects.filter(pk=self.users[2].pk).update(total_earnings=500)
+        self.assertEqual(leaderboard.rebuild('global'), 1)
+        self.assertEqual(leaderboard.get_rank('global', self.users[2].id), (1, 500))
+
+class GameHistoryTest(ReplicaOnPrimaryMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            session = GameSession.objects.create(entry_fee=0, status='finished')
+            Player.objects.create(
+                user=self.user,
+                session=session,
+                player_number=1,
+                is_alive=i != 0,
+                elimination_stage=1 if i == 0 else None
+            )
+        # Two players share a joined_at so the id tie-breaker is exercised
+        players = list(Player.objects.order_by('id'))
+        Player.objects.filter(pk=players[2].pk).update(joined_at=players[3].joined_at)
+
+    def test_history_pages_with_cursor(self):
+        """Test that cursor pages cover every game exactly once, newest first"""
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(1):
+                response = self.client.get('/games/history/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(row['session_id'] for row in response.data['results'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(Player.objects.filter(user=self.user).order_by('-joined_at', '-id')
+                        .values_list('session__session_id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 5)
+
+    def test_history_reports_stage_reached(self):
+        """Test that eliminated players report the stage they fell in"""
+        response = self.client.get('/games/history/', {'limit': 10})
+        stages = [row['stage_reached'] for row in response.data['results']]
+        self.assertEqual(stages.count('quiz'), 1)
+        self.assertEqual(stages.count('finished'), 4)
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected"""
+        response = self.client.get('/games/history/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AvatarCacheTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_attribute_keys_are_unique(self):
+        """Test that every attribute tuple maps to its own content address"""
+        fields = AvatarCustomizationSerializer().fields
+        combos = list(product(*(fields[name].choices for name in ['headwear', 'accessory', 'gender', 'favorite_color'])))
+        keys = {avatar_attributes_key(*combo) for combo in combos}
+        self.assertEqual(len(combos), 180)
+        self.assertEqual(len(keys), 180)
+        self.assertEqual(avatar_attributes_key(*combos[0]), avatar_attributes_key(*combos[0]))
+
+    def test_repeat_customization_skips_generation(self):
+        """Test that a stored avatar is reused without calling the generator"""
+        url = 'https://storage.example.com/avatars/cached.png'
+        cache.set(avatar_url_cache_key(avatar_attributes_key('crown', 'glasses', 'male', 'blue')), url)
+
+        with mock.patch.object(get_avatar_service(), 'generate_avatar_image') as generate:
+            response = self.client.post('/avatar/customize/', {
+                'headwear': 'crown',
+                'accessory': 'glasses',
+                'gender': 'male',
+                'favorite_color': 'blue'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['avatar_url'], url)
+        generate.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_url, url)
+
+@override_settings(AVATAR_STORAGE_BACKEND='game.avatar_storage.InMemoryAvatarStorage')
+class PregenerateAvatarsTest(CacheResetMixin, TestCase):
+    def test_command_generates_missing_avatars_and_resumes(self):
+        """Test that pregeneration fills every combination once and skips stored ones"""
+        stored = get_avatar_storage().files
+
+        call_command('pregenerate_avatars', '--fake', '--concurrency', '8', '--batch-size', '16', stdout=StringIO())
+        self.assertEqual(len(stored), 180)
+        self.assertTrue(all(data.startswith(b'\x89PNG') for data in stored.values()))
+
+        del stored[next(iter(stored))]
+        out = StringIO()
+        call_command('pregenerate_avatars', '--fake', stdout=out)
+        self.assertIn('179 of 180 avatars already stored', out.getvalue())
+        self.assertEqual(len(stored), 180)
+
+class AvatarStorageTest(TestCase):
+    def test_local_storage_writes_under_media_root(self):
+        """Test that local storage writes files nginx can serve from /media/"""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            AVATAR_STORAGE_BACKEND='game.avatar_storage.LocalAvatarStorage',
+            MEDIA_ROOT=media_root,
+            AVATAR_PUBLIC_BASE_URL='https://example.com/media/'
+        ):
+            storage = get_avatar_storage()
+            self.assertFalse(storage.exists('avatars/a.png'))
+            url = storage.save_async('avatars/a.png', b'png-bytes').result()
+            self.assertEqual(url, 'https://example.com/media/avatars/a.png')
+            self.assertTrue(storage.exists('avatars/a.png'))
+            self.assertEqual(storage.open('avatars/a.png'), b'png-bytes')
+            self.assertEqual(storage.save_many([('avatars/b.png', b'1'), ('avatars/c.png', b'2')]), [
+                'https://example.com/media/avatars/b.png',
+                'https://example.com/media/avatars/c.png'
+            ])
+            with self.assertRaises(ValueError):
+                storage.save('../escape.png', b'')
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=True,
+    AVATAR_STORAGE_BACKEND='game.avatar_storage.InMemoryAvatarStorage',
+    AVATAR_PUBLIC_BASE_URL='https://storage.example.com/',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class AvatarJobTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_customize_returns_202_and_pushes_avatar_ready(self):
+        """Test that a cache miss queues generation and notifies the user's sockets"""
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(user_group_name(self.user.id), channel)
+
+        avatar_service = get_avatar_service()
+        with mock.patch.object(avatar_service, 'generate_avatar_image', FakeAvatarGenerator().generate_image):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/avatar/customize/', {
+                    'headwear': 'cap',
+                    'accessory': 'scarf',
+                    'gender': 'female',
+                    'favorite_color': 'pink'
+                }, format='json')
+                self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+                self.user.refresh_from_db()
+                self.assertTrue(self.user.avatar_generation_in_progress)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar_generation_in_progress)
+        url = self.user.avatar_url
+        self.assertTrue(url.startswith('https://storage.example.com/avatars/'))
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message, {'type': 'avatar_ready', 'data': {'avatar_url': url}})
+
+    def test_failed_enqueue_clears_progress(self):
+        """Test that a broker error while queueing ends generation with avatar_failed"""
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(user_group_name(self.user.id), channel)
+        self.client.get('/profile/')
+
+        with mock.patch.object(generate_avatar, 'delay', side_effect=ConnectionError('broker down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/avatar/customize/', {
+                    'headwear': 'crown',
+                    'accessory': 'glasses',
+                    'gender': 'male',
+                    'favorite_color': 'red'
+                }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar_generation_in_progress)
+        self.assertFalse(self.client.get('/profile/').data['avatar_generation_in_progress'])
+        message = async_to_sync(layer.receive)(channel)
+        self.assertEqual(message['type'], 'avatar_failed')
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=True,
+    AVATAR_STORAGE_BACKEND='game.avatar_storage.InMemoryAvatarStorage',
+    AVATAR_PUBLIC_BASE_URL='https://storage.example.com/',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class AvatarAtlasTest(CacheResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        storage = get_avatar_storage()
+        self.session = GameSession.objects.create(status='waiting')
+        for number in (1, 2, 12):
+            user = User.objects.create_user(
+                nickname=f'player{number}',
+                email=f'player{number}@example.com',
+                password='testpass123'
+            )
+            user.avatar_url = storage.save(
+                f'avatars/{number}.png', FakeAvatarGenerator().generate_image(f'avatar {number}')
+            )
+            user.save()
+            Player.objects.create(user=user, session=self.session, player_number=number)
+
+    def test_atlas_built_when_session_enters_lobby(self):
+        """Test that entering the lobby composes one atlas with a tile per player"""
+        self.assertIsNone(get_session_atlas(self.session.session_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.status = 'lobby'
+            self.session.save()
+
+        atlas = get_session_atlas(self.session.session_id)
+        self.assertEqual(atlas['tiles'], {
+            '1': [0, 0],
+            '2': [TILE_SIZE, 0],
+            '12': [TILE_SIZE, TILE_SIZE]
+        })
+        path = atlas['url'][len('https://storage.example.com/'):]
+        image = Image.open(BytesIO(get_avatar_storage().open(path)))
+        self.assertEqual(image.size[0], 10 * TILE_SIZE)
+        self.assertGreaterEqual(image.size[1], 2 * TILE_SIZE)
+
+    def test_join_survives_broker_failure(self):
+        """Test that a failed atlas publish is logged and does not fail a paid join"""
+        GameSession.objects.filter(pk=self.session.pk).update(status='lobby')
+        user = User.objects.create_user(nickname='late', email='late@example.com', password='testpass123')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with mock.patch.object(build_avatar_atlas, 'apply_async', side_effect=ConnectionError('broker down')):
+            with self.assertLogs('game.sprites', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                response = client.post(f'/games/{self.session.session_id}/join/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.session.players.filter(user=user).exists())
+        self.assertIsNone(cache.get(atlas_pending_key(self.session.session_id)))
+
+class AvatarCoalescerTest(TestCase):
+    def make_generator(self, release=None):
+        class RecordingGenerator(FakeAvatarGenerator):
+            def __init__(self):
+                self.batches = []
+
+            def generate_images(self, prompts):
+                self.batches.append(list(prompts))
+                if release is not None:
+                    release.wait(5)
+                return super().generate_images(prompts)
+
+        return RecordingGenerator()
+
+    def run_concurrently(self, coalescer, prompts):
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            return list(executor.map(coalescer.generate, prompts))
+
+    def test_identical_prompts_share_one_generation(self):
+        """Test that concurrent requests for one prompt make a single backend call"""
+        release = threading.Event()
+        generator = self.make_generator(release)
+        coalescer = AvatarRequestCoalescer(generator, window=0.2)
+        timer = threading.Timer(0.5, release.set)
+        timer.start()
+        results = self.run_concurrently(coalescer, ['same prompt'] * 5)
+        timer.cancel()
+
+        self.assertEqual(generator.batches, [['same prompt']])
+        self.assertEqual(len(set(results)), 1)
+        self.assertIsNotNone(results[0])
+        self.assertEqual(coalescer.in_flight, {})
+
+    def test_distinct_prompts_batched_within_window(self):
+        """Test that distinct prompts arriving together are sent as one batch"""
+        generator = self.make_generator()
+        coalescer = AvatarRequestCoalescer(generator, window=1.0, max_batch=3)
+        results = self.run_concurrently(coalescer, ['a', 'b', 'c'])
+
+        self.assertEqual(len(generator.batches), 1)
+        self.assertEqual(sorted(generator.batches[0]), ['a', 'b', 'c'])
+        self.assertEqual(results, generator.generate_images(['a', 'b', 'c']))
+
+    def test_failed_generation_is_retried_by_next_caller(self):
+        """Test that a backend error resolves waiters with None and is not remembered"""
+        generator = self.make_generator()
+        coalescer = AvatarRequestCoalescer(generator, window=0)
+        with mock.patch.object(generator, 'generate_images', side_effect=RuntimeError('quota')):
+            self.assertIsNone(coalescer.generate('prompt'))
+        self.assertIsNotNone(coalescer.generate('prompt'))
+
+class TwoTierCacheTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_cache_stats()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_local_tier_then_shared_tier(self):
+        """Test that reads fall through local LRU to the shared cache and are counted"""
+        namespace = CacheNamespace('example', timeout=60, local_timeout=60)
+        self.assertIsNone(namespace.get('a'))
+        namespace.set('a', {'value': 1})
+        self.assertEqual(namespace.get('a'), {'value': 1})
+        local_cache.clear()
+        self.assertEqual(namespace.get('a'), {'value': 1})
+        self.assertEqual(cache_stats()['example'], {'local_hits': 1, 'shared_hits': 1, 'misses': 1})
+
+        namespace.invalidate_all()
+        self.assertIsNone(namespace.get('a'))
+
+    def test_profile_invalidated_on_user_save(self):
+        """Test that a cached profile is refreshed when the user changes"""
+        self.assertEqual(self.client.get('/profile/').data['balance'], '200000.00')
+        self.user.balance = 5
+        self.user.save(update_fields=['balance'])
+        response = self.client.get('/profile/')
+        self.assertEqual(response.data['balance'], '5.00')
+        self.client.get('/profile/')
+        self.assertEqual(cache_stats()['profile']['misses'], 2)
+
+    def test_quiz_pool_cached_and_invalidated(self):
+        """Test that quiz questions are served from the cached pool until a question changes"""
+        question = QuizQuestion.objects.create(
+            question_text='Q1', option_a='a', option_b='b', option_c='c', option_d='d',
+            correct_answer='A'
+        )
+        self.client.get('/quiz/questions/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/quiz/questions/')
+        self.assertEqual(response.data['total_questions'], 1)
+
+        question.is_active = False
+        question.save()
+        self.assertEqual(self.client.get('/quiz/questions/').data['total_questions'], 0)
+
+class ConditionalGetTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_profile_not_modified_without_queries(self):
+        """Test that a matching If-None-Match gets a 304 without touching the DB"""
+        response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put('/profile/', {'avatar_favorite_color': 'red'}, format='json')
+        response = self.client.get('/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['avatar_favorite_color'], 'red')
+
+    def test_avatar_options_cacheable(self):
+        """Test that avatar options carry a stable ETag and public Cache-Control"""
+        response = self.client.get('/avatar/options/')
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get('/avatar/options/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+class JSONCodecTest(TestCase):
+    def sample(self):
+        return {
+            'session_id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'prize_pool': Decimal('1600000.50'),
+            'balance': Decimal('0.10'),
+            'timestamp': timezone.now(),
+            'players': [{'player_number': 1, 'nickname': 'Игрок '}],
+            'tiles': {1: [0, 0]}
+        }
+
+    def test_matches_drf_renderer(self):
+        """Test that the fast renderer produces the same bytes as DRF's JSONRenderer"""
+        self.assertIsNotNone(orjson)
+        data = self.sample()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_stdlib_fallback(self):
+        """Test that the codec works without orjson"""
+        data = self.sample()
+        expected = json_codec.loads(json_codec.dumps(data))
+        with mock.patch.object(json_codec, 'orjson', None):
+            self.assertEqual(json_codec.loads(json_codec.dumps(data)), expected)
+            self.assertEqual(json_codec.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(expected['prize_pool'], 1600000.5)
+        self.assertEqual(expected['session_id'], '12345678-1234-5678-1234-567812345678')
+
+class IndexPlanTest(CacheResetMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.session = GameSession.objects.create()
+        self.player = Player.objects.create(user=self.user, session=self.session, player_number=1)
+        self.question = QuizQuestion.objects.create(
+            question_text='Q1', option_a='a', option_b='b', option_c='c', option_d='d',
+            correct_answer='A'
+        )
+
+    def plan(self, queryset):
+        """Query plan text; on Postgres sequential scans are disabled so tiny tables still show index choice"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        return queryset.explain()
+
+    def test_hot_queries_use_indexes(self):
+        """Test that the hot game table lookups are planned on the intended indexes"""
+        self.assertIn('player_session_alive_idx', self.plan(
+            Player.objects.filter(session=self.session, is_alive=True)
+        ))
+        self.assertIn('quiz_answer_session_q_idx', self.plan(
+            QuizAnswer.objects.filter(session=self.session, question=self.question)
+        ))
+        # SQLite builds plain unique constraints into the table as an autoindex
+        self.assertRegex(self.plan(
+            QuizAnswer.objects.filter(player=self.player, question=self.question)
+        ), 'quiz_answer_player_question_uniq|sqlite_autoindex_game_quizanswer')
+        # Either session index is acceptable, depending on planner statistics
+        self.assertRegex(self.plan(
+            GameSession.objects.filter(status__in=['waiting', 'lobby']).order_by('created_at')
+        ), 'session_joinable_idx|session_status_idx')
+
+    def test_player_number_unique_per_session(self):
+        """Test that (session, player_number) uniqueness is enforced again"""
+        other = User.objects.create_user(nickname='other', email='o@example.com', password='testpass123')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Player.objects.create(user=other, session=self.session, player_number=1)
+
+    def test_one_answer_per_question(self):
+        """Test that a player cannot record two answers to one question"""
+        QuizAnswer.objects.create(
+            player=self.player, session=self.session, question=self.question,
+            answer='A', is_correct=True, time_taken=1
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            QuizAnswer.objects.create(
+                player=self.player, session=self.session, question=self.question,
+                answer='B', is_correct=False, time_taken=2
+            )
+
+    def test_join_game_query_count(self):
+        """Test that joining a game stays within a fixed number of queries"""
+        other = User.objects.create_user(nickname='other', email='o@example.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+        with self.assertNumQueries(13):
+            response = self.client.post(f'/games/{self.session.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['player_number'], 2)
+
+class SessionCountersTest(TestCase):
+    def setUp(self):
+        self.session = GameSession.objects.create()
+        self.players = []
+        for number in (1, 2, 3):
+            user = User.objects.create_user(
+                nickname=f'player{number}',
+                email=f'player{number}@example.com',
+                password='testpass123'
+            )
+            self.players.append(Player.objects.create(user=user, session=self.session, player_number=number))
+
+    def test_counters_follow_joins_and_eliminations(self):
+        """Test that joins and eliminations keep player_count/alive_count in step"""
+        stale = GameSession.objects.get(pk=self.session.pk)
+        self.assertEqual((stale.player_count, stale.alive_count), (3, 3))
+
+        self.assertTrue(self.players[0].eliminate(1))
+        self.assertFalse(Player.objects.get(pk=self.players[0].pk).eliminate(1))
+        self.assertEqual(self.session.eliminate_players(self.session.players.filter(player_number__gte=2), 2), 2)
+
+        # A full save() from an instance loaded earlier leaves the counters alone
+        stale.status = 'finished'
+        stale.save()
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.player_count, self.session.alive_count), (3, 0))
+        self.assertEqual(self.session.status, 'finished')
+
+    def test_reconcile_repairs_drift(self):
+        """Test that reconcile_session_counters recounts drifted sessions"""
+        GameSession.objects.filter(pk=self.session.pk).update(player_count=10, alive_count=7)
+        Player.objects.filter(pk=self.players[0].pk).update(is_alive=False)
+        call_command('reconcile_session_counters', stdout=StringIO())
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.player_count, self.session.alive_count), (3, 2))
+
+class SessionArchiveTest(ReplicaOnPrimaryMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.session = GameSession.objects.create(status='finished', finished_at=timezone.now() - timedelta(days=2))
+        self.player = Player.objects.create(user=self.user, session=self.session, player_number=7, final_prize=500)
+        for i in range(3):
+            question = QuizQuestion.objects.create(
+                question_text=f'Q{i}', option_a='a', option_b='b', option_c='c', option_d='d',
+                correct_answer='A'
+            )
+            QuizAnswer.objects.create(
+                player=self.player, session=self.session, question=question,
+                answer='A', is_correct=True, time_taken=1.5
+            )
+        ChatMessage.objects.create(session=self.session, player=self.player, message='gg')
+        RedLightMovement.objects.create(
+            player=self.player, session=self.session, from_x=0, from_y=0, to_x=10, to_y=0
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_archive_round_trip(self):
+        """Test that archiving moves child rows into one blob and the API reads it back unchanged"""
+        url = f'/games/{self.session.session_id}/events/'
+        live = json.loads(self.client.get(url).content)
+        self.assertFalse(live['archived'])
+        self.assertEqual(len(live['quiz_answers']), 3)
+
+        with self.settings(SESSION_ARCHIVE_DELETE_BATCH_SIZE=2):
+            call_command('archive_sessions', stdout=StringIO())
+
+        archive = SessionArchive.objects.get(session=self.session)
+        self.assertEqual(archive.quiz_answer_count, 3)
+        self.assertLess(len(archive.data), archive.raw_size)
+        self.assertFalse(QuizAnswer.objects.filter(session=self.session).exists())
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertFalse(RedLightMovement.objects.exists())
+        self.assertEqual(self.session.statistics.total_players, 1)
+        self.assertEqual(self.session.statistics.winners_count, 1)
+
+        archived = json.loads(self.client.get(url).content)
+        self.assertTrue(archived.pop('archived'))
+        live.pop('archived')
+        self.assertEqual(archived, live)
+
+class GameStatisticsTest(TestCase):
+    def make_session(self, survivors_prize=0):
+        now = timezone.now()
+        session = GameSession.objects.create(
+            status='finished', started_at=now - timedelta(seconds=100), finished_at=now
+        )
+        for number, stage in ((1, None), (2, 1), (3, 2)):
+            user = User.objects.create_user(
+                nickname=f'player{session.pk}_{number}',
+                email=f'player{session.pk}_{number}@example.com',
+                password='testpass123'
+            )
+            Player.objects.create(
+                user=user, session=session, player_number=number,
+                is_alive=stage is None, elimination_stage=stage,
+                eliminated_at=None if stage is None else now - timedelta(seconds=70),
+                final_prize=survivors_prize if stage is None else 0
+            )
+        return session
+
+    def test_update_statistics_single_query(self):
+        """Test that statistics come from one aggregate query plus the upsert"""
+        session = self.make_session(survivors_prize=1000)
+        with CaptureQueriesContext(connection) as queries:
+            statistics = update_statistics(session)
+        self.assertEqual(len([q for q in queries if 'game_player' in q['sql']]), 1)
+        self.assertEqual(statistics.total_players, 3)
+        self.assertEqual(statistics.quiz_eliminations, 1)
+        self.assertEqual(statistics.red_light_eliminations, 1)
+        self.assertEqual(statistics.winners_count, 1)
+        self.assertEqual(statistics.total_prize_distributed, 1000)
+        # (100 + 30 + 30) / 3 seconds
+        self.assertAlmostEqual(statistics.average_survival_time, 53.333, places=2)
+
+    def test_backfill_in_chunks(self):
+        """Test that the backfill command fills every finished session in bounded chunks"""
+        sessions = [self.make_session() for _ in range(3)]
+        GameSession.objects.create(status='finished')
+        with self.assertNumQueries(2 * 3 + 1):
+            call_command('backfill_statistics', '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(GameStatistics.objects.count(), 4)
+        self.assertEqual(GameStatistics.objects.get(session=sessions[0]).winners_count, 1)
+
+class BalanceLedgerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            nickname='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.session = GameSession.objects.create(entry_fee=150000)
+
+    def test_new_user_gets_opening_row(self):
+        """Test that a new user's starting balance is recorded in the ledger"""
+        entry = self.user.balance_transactions.get()
+        self.assertEqual((entry.kind, entry.amount), ('opening', 200000))
+
+    def test_join_posts_entry_fee(self):
+        """Test that joining debits the fee through the ledger and refuses overdrafts"""
+        other = GameSession.objects.create(entry_fee=150000)
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/profile/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/games/{self.session.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The F() update skips post_save, so the ledger drops the cached profile itself
+        self.assertIsNone(profile_cache.get(self.user.pk))
+
+        response = self.client.post(f'/games/{other.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Insufficient balance')
+        self.assertFalse(other.players.exists())
+
+        self.user.refresh_from_db()
+        self.session.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('50000'))
+        self.assertEqual((self.session.prize_pool, other.prize_pool), (Decimal('150000'), Decimal('0')))
+        self.assertEqual(list(self.user.balance_transactions.order_by('id').values_list('kind', 'amount')), [
+            ('opening', Decimal('200000')), ('entry_fee', Decimal('-150000'))
+        ])
+
+    def test_rejoin_after_removal_pays_again(self):
+        """Test that rejoining after a Player is deleted charges a new fee for the new seat"""
+        self.session.entry_fee = 50000
+        self.session.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f'/games/{self.session.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.session.players.get(user=self.user).delete()
+
+        response = self.client.post(f'/games/{self.session.session_id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user.refresh_from_db()
+        self.session.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('100000'))
+        self.assertEqual(self.session.prize_pool, Decimal('100000'))
+        self.assertEqual(self.user.balance_transactions.filter(kind='entry_fee', session=self.session).count(), 2)
+
+    def test_stale_save_keeps_balance(self):
+        """Test that a full save() of a stale user does not undo a ledger posting"""
+        ledger.post(self.user.pk, -100, 'adjustment', 'adjustment:test')
+        self.user.avatar_gender = 'female'
+        self.user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.balance, self.user.avatar_gender), (Decimal('199900'), 'female'))
+
+    def test_payout_is_idempotent(self):
+        """Test that reposting a payout key pays and counts the win once"""
+        key = ledger.payout_key(self.session, self.user.pk)
+        for expected in (True, False):
+            _, paid = ledger.post(
+                self.user.pk, Decimal('1000.555'), 'payout', key, session=self.session,
+                total_earnings=Decimal('1000.55'), total_games_won=1
+            )
+            self.assertEqual(paid, expected)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('201000.55'))
+        self.assertEqual((self.user.total_earnings, self.user.total_games_won), (Decimal('1000.55'), 1))
+
+    def test_verify_balances(self):
+        """Test that verify_balances reports drift and --fix restores the ledger sum"""
+        User.objects.create_user(nickname='other', email='o@example.com', password='testpass123')
+        User.objects.filter(pk=self.user.pk).update(balance=5)
+
+        out = StringIO()
+        call_command('verify_balances', '--chunk-size', '1', stdout=out)
+        self.assertIn('Checked 2 users, 1 drifted', out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('5'))
+
+        call_command('verify_balances', '--fix', stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('200000'))
+
+class ConnectionPoolTest(TestCase):
+    class FakeConnection:
+        def __init__(self):
+            self.closed = False
+            self.pings = 0
+
+        def close(self):
+            self.closed = True
+
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            self.opened.append(self.FakeConnection())
+            return self.opened[-1]
+
+        def ping(connection):
+            connection.pings += 1
+            if connection.pings > 1:
+                raise ConnectionError('server closed the connection')
+
+        return ConnectionPool(connect, **{'max_size': 2, 'timeout': 0.05, 'check': ping, **kwargs})
+
+    def test_reuses_and_bounds_connections(self):
+        """Test that released connections are reused and checkouts beyond max_size time out"""
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats.as_dict()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        """Test that a blocked checkout takes the next released connection and records the wait"""
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        threading.Timer(0.05, pool.release, [connection]).start()
+        self.assertIs(pool.acquire(), connection)
+        stats = pool.stats.as_dict()
+        self.assertEqual(stats['waited'], 1)
+        self.assertGreaterEqual(stats['wait_max_ms'], 40)
+
+    def test_health_check_replaces_dead_connections(self):
+        """Test that idle connections are pinged before reuse and broken ones replaced"""
+        pool = self.make_pool(check_after=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        pool.release(connection)
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats.as_dict()['discarded'], 1)
+
+        replacement.closed = True
+        pool.release(replacement)
+        self.assertEqual((pool.size, len(pool.idle)), (0, 0))
+
+    def test_db_sync_to_async_runs_on_db_executor(self):
+        """Test that db_sync_to_async calls run on the sized DB executor and record queue waits"""
+        class Handler:
+            @db_sync_to_async
+            def thread_name(self):
+                return threading.current_thread().name
+
+        executor_stats.reset()
+        self.assertTrue(async_to_sync(Handler().thread_name)().startswith('db'))
+        self.assertEqual(executor_stats.as_dict()['checkouts'], 1)
+
+class ReplicaRouterTest(TestCase):
+    def test_only_read_only_scopes_use_replica(self):
+        """Test that reads go to the replica only inside read_only and before the request writes"""
+        with override_settings(DATABASE_REPLICA='replica'):
+            self.assertEqual(GameSession.objects.all().db, 'default')
+            with read_only():
+                self.assertEqual(GameSession.objects.all().db, 'replica')
+                self.assertEqual(GameSession.objects.all().using('default').db, 'default')
+
+            def view(request):
+                routed = []
+                with read_only():
+                    routed.append(GameSession.objects.all().db)
+                    GameSession.objects.create()
+                    routed.append(GameSession.objects.all().db)
+                return routed
+
+            self.assertEqual(ReplicaRoutingMiddleware(view)(None), ['replica', 'default'])
+            # Stickiness ends with the request
+            with read_only():
+                self.assertEqual(GameSession.objects.all().db, 'replica')
+
+    def test_async_chain_not_adapted(self):
+        """Test that the middleware runs natively under ASGI and still pins reads after a write"""
+        # Django only logs middleware adaptation with DEBUG on
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+        def write_and_route():
+            with read_only():
+                GameSession.objects.create()
+                return GameSession.objects.all().db
+
+        async def view(request):
+            return await sync_to_async(write_and_route)()
+
+        with override_settings(DATABASE_REPLICA='replica'):
+            self.assertEqual(async_to_sync(ReplicaRoutingMiddleware(view))(None), 'default')
+
+    def test_no_replica_configured(self):
+        """Test that read_only is a no-op without a replica alias"""
+        with override_settings(DATABASE_REPLICA=None), read_only():
+            self.assertEqual(GameSession.objects.all().db, 'default')
+
+    def test_decorated_calls_do_not_share_scope(self):
+        """Test that a read_only decorated function resets its scope on return"""
+        @read_only
+        def routed():
+            return GameSession.objects.all().db
+
+        with override_settings(DATABASE_REPLICA='replica'):
+            self.assertEqual(routed(), 'replica')
+            self.assertEqual(GameSession.objects.all().db, 'default')
+
+def async_to_sync_call(coroutine_function, *args):
+    return async_to_sync(coroutine_function)(*args)
+
+@override_settings(DB_EXECUTOR_WORKERS=0)
+class ConsumerHopsTest(CacheResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = GameSession.objects.create(status='quiz', prize_pool=300)
+        self.players = []
+        for number in (1, 2, 3):
+            user = User.objects.create_user(
+                nickname=f'hop{number}',
+                email=f'hop{number}@example.com',
+                password='testpass123'
+            )
+            self.players.append(Player.objects.create(user=user, session=self.session, player_number=number))
+        self.question = QuizQuestion.objects.create(
+            question_text='Hop question',
+            option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A'
+        )
+        self.consumer = GameConsumer()
+        self.consumer.session_id = str(self.session.session_id)
+        self.consumer.room_group_name = f'game_{self.session.session_id}'
+        self.consumer.channel_name = 'test.hops'
+        self.consumer.channel_layer = InMemoryChannelLayer()
+        self.consumer.user = self.players[0].user
+        self.consumer.seat = None
+
+    def run_counting_hops(self, method, *args):
+        """Run a consumer coroutine method and return its result and the db_sync_to_async calls it made"""
+        original = PooledDatabaseSyncToAsync.__call__
+        hops = []
+
+        async def counting(wrapper, *call_args, **call_kwargs):
+            hops.append(wrapper.func.__name__)
+            return await original(wrapper, *call_args, **call_kwargs)
+
+        with mock.patch.object(PooledDatabaseSyncToAsync, '__call__', counting):
+            result = async_to_sync(getattr(self.consumer, method))(*args)
+        return result, hops
+
+    def test_connect_state_in_one_hop(self):
+        """Test that the seat and initial game state load in a single call"""
+        (seat, state), hops = self.run_counting_hops('load_connection_state')
+        self.assertEqual(hops, ['load_connection_state'])
+        self.assertEqual((seat['player_number'], seat['nickname']), (1, 'hop1'))
+        self.assertEqual(state['status'], 'quiz')
+        self.assertEqual(len(state['players']), 3)
+
+    def test_quiz_answer_is_one_hop(self):
+        """Test that an answer frame checks, saves and rejects repeats in one call each"""
+        frame = {'question_id': self.question.id, 'answer': 'A', 'time_taken': 2.0}
+        _, hops = self.run_counting_hops('handle_quiz_answer', frame)
+        # The first frame also loads the seat; later frames reuse it
+        self.assertEqual(hops, ['load_seat', 'save_quiz_answer'])
+        _, hops = self.run_counting_hops('handle_quiz_answer', frame)
+        self.assertEqual(hops, ['save_quiz_answer'])
+        self.assertEqual(QuizAnswer.objects.filter(player=self.players[0]).count(), 1)
+
+        GameSession.objects.filter(pk=self.session.pk).update(status='red_light')
+        self.assertIsNone(async_to_sync_call(self.consumer.save_quiz_answer, self.consumer.seat, self.question.id, 'A', 1.0))
+
+    def test_quiz_losers_eliminated_in_one_hop(self):
+        """Test that the bottom scorer is eliminated and reported from a single call"""
+        for player, answer in zip(self.players, 'AAB'):
+            QuizAnswer.objects.create(
+                player=player, session=self.session, question=self.question,
+                answer=answer, is_correct=answer == 'A', time_taken=float(player.player_number)
+            )
+        eliminations, hops = self.run_counting_hops('eliminate_quiz_losers')
+        self.assertEqual(hops, ['eliminate_quiz_losers'])
+        self.assertEqual([e['player_number'] for e in eliminations], [3])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.alive_count, 2)
+
+    def test_red_light_elimination_reported_once(self):
+        """Test that moving on red eliminates once and returns the broadcast payload"""
+        GameSession.objects.filter(pk=self.session.pk).update(status='red_light')
+        seat = async_to_sync_call(self.consumer.load_seat)
+        elimination = async_to_sync_call(self.consumer.eliminate_moving_player, seat)
+        self.assertEqual(elimination['stage'], 'red_light')
+        self.assertIsNone(async_to_sync_call(self.consumer.eliminate_moving_player, seat))
+        self.assertFalse(async_to_sync_call(self.consumer.update_player_position, seat, 10, 10))
+
+    def test_distribute_prizes_returns_results(self):
+        """Test that prizes are paid in the worker and results broadcast by the caller"""
+        with self.captureOnCommitCallbacks(execute=True):
+            results = async_to_sync_call(self.consumer.distribute_prizes)
+        self.assertEqual(len(results['winners']), 3)
+        self.assertEqual(results['winners'][0]['prize'], 100.0)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'finished')
+
+class QuestionImportTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('import_quiz_questions', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reimport_updates_in_place(self):
+        """Test that re-importing a CSV updates questions without dropping their answers"""
+        header = 'external_id,question_text,option_a,option_b,option_c,option_d,correct_answer,difficulty,category\n'
+        path = self.write('bank.csv', header + 'q1,First?,a,b,c,d,A,2,general\nq2,Second?,a,b,c,d,b,,\n')
+        self.assertIn('2 created, 0 updated', self.call(path, '--batch-size', '1'))
+
+        question = QuizQuestion.objects.get(external_id='q1')
+        user = User.objects.create_user(nickname='importer', email='importer@example.com', password='testpass123')
+        session = GameSession.objects.create()
+        player = Player.objects.create(user=user, session=session, player_number=1)
+        QuizAnswer.objects.create(player=player, session=session, question=question, answer='A', is_correct=True, time_taken=1)
+
+        path = self.write('bank.csv', header + 'q1,"First, reworded?",a,b,c,d,C,2,general\n')
+        self.assertIn('0 created, 1 updated', self.call(path))
+        question.refresh_from_db()
+        self.assertEqual((question.question_text, question.correct_answer), ('First, reworded?', 'C'))
+        self.assertEqual(QuizAnswer.objects.filter(question=question).count(), 1)
+        self.assertEqual(QuizQuestion.objects.get(external_id='q2').correct_answer, 'B')
+
+    def test_replace_deactivates_missing(self):
+        """Test that --replace deactivates questions absent from a JSONL file instead of deleting them"""
+        rows = [
+            {'external_id': f'q{i}', 'question_text': f'Q{i}?', 'option_a': 'a', 'option_b': 'b',
+             'option_c': 'c', 'option_d': 'd', 'correct_answer': 'D'}
+            for i in range(3)
+        ]
+        self.call(self.write('bank.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\n'))
+        self.assertEqual(len(get_quiz_question_pool()), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.call(self.write('bank.jsonl', json.dumps(rows[0]) + '\n\n'), '--replace')
+        self.assertIn('1 active', output)
+        self.assertEqual(QuizQuestion.objects.count(), 3)
+        self.assertEqual([q.external_id for q in get_quiz_question_pool()], ['q0'])
+
+    def test_bad_row_imports_nothing(self):
+        """Test that an invalid row aborts the import with its line number"""
+        path = self.write('bank.jsonl', '\n'.join([
+            json.dumps({'external_id': 'ok', 'question_text': 'Q?', 'option_a': 'a', 'option_b': 'b',
+                        'option_c': 'c', 'option_d': 'd', 'correct_answer': 'A'}),
+            json.dumps({'external_id': 'bad', 'question_text': 'Q?', 'option_a': 'a', 'option_b': 'b',
+                        'option_c': 'c', 'option_d': 'd', 'correct_answer': 'E'}),
+        ]))
+        with self.assertRaisesMessage(CommandError, 'Line 2: correct_answer'):
+            self.call(path)
+        self.assertFalse(QuizQuestion.objects.exists())
+
+    def test_create_quiz_questions_is_rerunnable(self):
+        """Test that create_quiz_questions upserts its set and keeps answers to it"""
+        call_command('create_quiz_questions', stdout=StringIO())
+        question = QuizQuestion.objects.get(external_id='incubator-1')
+        user = User.objects.create_user(nickname='rerun', email='rerun@example.com', password='testpass123')
+        session = GameSession.objects.create()
+        player = Player.objects.create(user=user, session=session, player_number=1)
+        QuizAnswer.objects.create(player=player, session=session, question=question, answer='B', is_correct=True, time_taken=1)
+
+        call_command('create_quiz_questions', stdout=StringIO())
+        self.assertEqual(QuizQuestion.objects.count(), 6)
+        self.assertTrue(QuizAnswer.objects.filter(question=question).exists())
+
+class ExportTest(ReplicaOnPrimaryMixin, APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            nickname='ops', email='ops@example.com', password='testpass123', is_staff=True
+        )
+        question = QuizQuestion.objects.create(
+            question_text='Q', option_a='a', option_b='b', option_c='c', option_d='d', correct_answer='A'
+        )
+        self.sessions = []
+        for index in range(2):
+            session = GameSession.objects.create(status='finished', finished_at=timezone.now())
+            for number in (1, 2):
+                user = User.objects.create_user(
+                    nickname=f'export{index}{number}', email=f'export{index}{number}@example.com', password='testpass123'
+                )
+                player = Player.objects.create(user=user, session=session, player_number=number)
+                QuizAnswer.objects.create(
+                    player=player, session=session, question=question,
+                    answer='A', is_correct=True, time_taken=number
+                )
+                ChatMessage.objects.create(session=session, player=player, message=f'hi, from {number}')
+            self.sessions.append(session)
+        # The second session's answers and chat only exist in its archive now
+        archive_session(self.sessions[1])
+        self.client.force_authenticate(user=self.admin)
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_jsonl_includes_archived_sessions(self):
+        """Test that answer exports stream live and archived rows alike"""
+        response = self.client.get('/exports/answers.jsonl')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(
+            {row['session_id'] for row in rows},
+            {str(session.session_id) for session in self.sessions}
+        )
+        self.assertEqual(set(rows[0]), {
+            'session_id', 'player_number', 'question_id', 'answer', 'is_correct', 'time_taken', 'answered_at'
+        })
+        # Live and archived timestamps render the same way
+        self.assertEqual(len({len(row['answered_at']) for row in rows}), 1)
+
+        response = self.client.get(f'/exports/chat.jsonl?session={self.sessions[1].session_id}')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['message'] for row in rows], ['hi, from 1', 'hi, from 2'])
+
+    def test_gzipped_csv(self):
+        """Test that ?gzip=1 compresses the CSV on the fly"""
+        response = self.client.get('/exports/results.csv?gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('results.csv.gz', response['Content-Disposition'])
+        text = gzip.decompress(self.read(response)).decode()
+        rows = list(csv.DictReader(StringIO(text)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['status'], 'finished')
+        self.assertEqual(rows[0]['nickname'], 'export01')
+
+    def test_admin_only_and_bad_requests(self):
+        """Test that exports need staff and reject unknown datasets and session ids"""
+        self.assertEqual(self.client.get('/exports/players.csv').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/exports/chat.csv?session=nope').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=User.objects.get(nickname='export01'))
+        self.assertEqual(self.client.get('/exports/chat.csv').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        """Test that export_sessions writes a gzipped file, picking the format from its name"""
+        path = os.path.join(tempfile.mkdtemp(), 'answers.jsonl.gz')
+        call_command('export_sessions', 'answers', path, '--session', str(self.sessions[0].session_id), stdout=StringIO())
+        with gzip.open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['player_number'] for row in rows], [1, 2])
+        os.remove(path)
@@ -0,0 +1,24 @@
+from rest_framework.throttling import BaseThrottle
+from . import ratelimit
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle backed by the shared token buckets in game.ratelimit"""
+    scope = None
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = ratelimit.check(self.scope, self.get_ident_key(request))
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+class JoinGameThrottle(TokenBucketThrottle):
+    scope = 'join_game'
+
+class CustomizeAvatarThrottle(TokenBucketThrottle):
+    scope = 'customize_avatar'
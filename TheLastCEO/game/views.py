@@ -1,62 +1,165 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import login
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import User, GameSession, Player, QuizQuestion
+from django.db.models import F, Q
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, etag
+from django.views.decorators.vary import vary_on_headers
+from .models import User, GameSession, Player, BalanceTransaction
 from .serializers import (
-    UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer,
+    UserRegistrationSerializer, UserCredentialsSerializer, UserProfileSerializer,
     GameSessionSerializer, PlayerSerializer, AvatarCustomizationSerializer
 )
-from .avatar_service import avatar_service
+from .db_router import read_only
+from .caching import get_version, profile_cache, session_cache, get_quiz_question_pool
+from .avatar_service import get_avatar_service, avatar_attributes_key
+from .tasks import enqueue_avatar
+from .sprites import schedule_atlas_build
+from .archive import session_events
+from .pagination import encode_cursor, decode_datetime_cursor
+from .throttling import JoinGameThrottle, CustomizeAvatarThrottle
+from . import exports, leaderboard, ledger
+from redis.exceptions import RedisError
+from . import json_codec
+from .hashing import HashingOverloaded, make_password_async, check_password_async
+import hashlib
+import json
 import logging
+import random
+import uuid
 
 logger = logging.getLogger(__name__)
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def register(request):
+def _json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(
+        json_codec.FastJSONRenderer().render(data),
+        content_type='application/json',
+        status=status_code
+    )
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+def _parse_body(request):
+    if request.content_type == 'application/json':
+        return json_codec.loads(request.body or b'{}')
+    return request.POST
+
+def _overloaded_response():
+    return _json_response({
+        'error': 'Server is busy, please retry shortly'
+    }, status.HTTP_429_TOO_MANY_REQUESTS, {'Retry-After': '1'})
+
+def _token_response(user, status_code=status.HTTP_200_OK):
+    refresh = RefreshToken.for_user(user)
+    return _json_response({
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user_id': user.id,
+        'nickname': user.nickname,
+        'balance': user.balance
+    }, status_code)
+
+# register and login_view are native async views so PBKDF2 runs in the
+# hashing pool instead of pinning the worker that also serves WebSockets.
+async def register(request):
     """User registration endpoint"""
-    serializer = UserRegistrationSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'user_id': user.id,
-            'nickname': user.nickname,
-            'balance': user.balance
-        }, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if request.method != 'POST':
+        return _json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        data = _parse_body(request)
+    except ValueError as e:
+        return _json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
 
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def login_view(request):
+    serializer = UserRegistrationSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    validated = serializer.validated_data
+    try:
+        encoded_password = await make_password_async(validated['password'])
+    except HashingOverloaded:
+        return _overloaded_response()
+
+    user = User(
+        nickname=validated['nickname'],
+        email=User.objects.normalize_email(validated.get('email')),
+        password=encoded_password
+    )
+    try:
+        await user.asave()
+    except IntegrityError:
+        return _json_response({
+            'nickname': ['user with this nickname already exists.']
+        }, status.HTTP_400_BAD_REQUEST)
+    return _token_response(user, status.HTTP_201_CREATED)
+
+register.csrf_exempt = True
+
+async def login_view(request):
     """User login endpoint"""
-    serializer = UserLoginSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.validated_data['user']
-        login(request, user)
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'user_id': user.id,
-            'nickname': user.nickname,
-            'balance': user.balance
-        })
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if request.method != 'POST':
+        return _json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        data = _parse_body(request)
+    except ValueError as e:
+        return _json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = UserCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    nickname = serializer.validated_data['nickname']
+    password = serializer.validated_data['password']
+
+    try:
+        user = await User.objects.aget(nickname=nickname)
+    except User.DoesNotExist:
+        user = None
+    try:
+        if user is None:
+            # Hash anyway so unknown nicknames take as long as wrong passwords
+            await make_password_async(password)
+            valid = False
+        else:
+            valid = await check_password_async(password, user.password) and user.is_active
+    except HashingOverloaded:
+        return _overloaded_response()
+
+    if not valid:
+        return _json_response({
+            'non_field_errors': ['Invalid credentials']
+        }, status.HTTP_400_BAD_REQUEST)
+
+    user.last_login = timezone.now()
+    await User.objects.filter(pk=user.pk).aupdate(last_login=user.last_login)
+    # aupdate() skips post_save
+    await sync_to_async(ledger.invalidate_user_caches)(user.pk)
+    return _token_response(user)
+
+login_view.csrf_exempt = True
+
+def _profile_etag(request):
+    return f"profile-{request.user.pk}-{get_version('profile', request.user.pk)}"
 
+@cache_control(private=True, no_cache=True)
+@vary_on_headers('Authorization')
 @api_view(['GET', 'PUT'])
 @permission_classes([permissions.IsAuthenticated])
+@condition(etag_func=_profile_etag)
 def profile(request):
     """User profile endpoint"""
     if request.method == 'GET':
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
+        data = profile_cache.get_or_set(
+            request.user.pk, lambda: dict(UserProfileSerializer(request.user).data)
+        )
+        return Response(data)
     elif request.method == 'PUT':
         serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
         if serializer.is_valid():
@@ -64,8 +167,15 @@ def profile(request):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# request.user may be the cached copy; customize writes only what it changed
+AVATAR_FIELDS = [
+    'avatar_headwear', 'avatar_accessory', 'avatar_gender', 'avatar_favorite_color',
+    'avatar_url', 'avatar_generation_in_progress'
+]
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([CustomizeAvatarThrottle])
 def customize_avatar(request):
     """Customize user avatar"""
     serializer = AvatarCustomizationSerializer(data=request.data)
@@ -78,62 +188,82 @@ def customize_avatar(request):
         user.avatar_accessory = data.get('accessory')
         user.avatar_gender = data.get('gender')
         user.avatar_favorite_color = data.get('favorite_color')
-        user.save()
         
-        # Generate new avatar
-        try:
-            avatar_url = avatar_service.generate_avatar_url(user)
+        # A stored avatar for these attributes is just a URL assignment
+        avatar_url = get_avatar_service().get_cached_avatar_url(avatar_attributes_key(
+            user.avatar_headwear, user.avatar_accessory, user.avatar_gender, user.avatar_favorite_color
+        ))
+        if avatar_url:
             user.avatar_url = avatar_url
-            user.save()
-            
+            user.avatar_generation_in_progress = False
+            user.save(update_fields=AVATAR_FIELDS)
             return Response({
                 'message': 'Avatar customized successfully',
                 'avatar_url': avatar_url
             })
-        except Exception as e:
-            logger.error(f"Error generating avatar: {str(e)}")
-            return Response({
-                'error': 'Failed to generate avatar'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Otherwise generate in the background; the user's sockets get avatar_ready
+        user.avatar_generation_in_progress = True
+        user.save(update_fields=AVATAR_FIELDS)
+        transaction.on_commit(lambda: enqueue_avatar(
+            user.id,
+            user.avatar_headwear,
+            user.avatar_accessory,
+            user.avatar_gender,
+            user.avatar_favorite_color
+        ))
+        return Response({
+            'message': 'Avatar generation started',
+            'avatar_generation_in_progress': True
+        }, status=status.HTTP_202_ACCEPTED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Static, so served straight from memory with an ETag computed once
+AVATAR_OPTIONS = {
+    'headwear': [
+        {'value': 'bandana', 'name': 'Bandana'},
+        {'value': 'crown', 'name': 'Crown'},
+        {'value': 'cap', 'name': 'Cap'},
+    ],
+    'accessories': [
+        {'value': 'scarf', 'name': 'Scarf'},
+        {'value': 'earrings', 'name': 'Earrings'},
+        {'value': 'glasses', 'name': 'Glasses'},
+    ],
+    'gender': [
+        {'value': 'male', 'name': 'Male'},
+        {'value': 'female', 'name': 'Female'},
+    ],
+    'favorite_color': [
+        {'value': 'red', 'name': 'Red'},
+        {'value': 'blue', 'name': 'Blue'},
+        {'value': 'green', 'name': 'Green'},
+        {'value': 'yellow', 'name': 'Yellow'},
+        {'value': 'purple', 'name': 'Purple'},
+        {'value': 'orange', 'name': 'Orange'},
+        {'value': 'pink', 'name': 'Pink'},
+        {'value': 'black', 'name': 'Black'},
+        {'value': 'white', 'name': 'White'},
+        {'value': 'brown', 'name': 'Brown'},
+    ]
+}
+
+AVATAR_OPTIONS_ETAG = 'avatar-options-' + hashlib.sha256(
+    json.dumps(AVATAR_OPTIONS, sort_keys=True).encode()
+).hexdigest()[:16]
+
+@cache_control(public=True, max_age=86400)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@etag(lambda request: AVATAR_OPTIONS_ETAG)
 def avatar_options(request):
     """Get available avatar customization options"""
-    options = {
-        'headwear': [
-            {'value': 'bandana', 'name': 'Bandana'},
-            {'value': 'crown', 'name': 'Crown'},
-            {'value': 'cap', 'name': 'Cap'},
-        ],
-        'accessories': [
-            {'value': 'scarf', 'name': 'Scarf'},
-            {'value': 'earrings', 'name': 'Earrings'},
-            {'value': 'glasses', 'name': 'Glasses'},
-        ],
-        'gender': [
-            {'value': 'male', 'name': 'Male'},
-            {'value': 'female', 'name': 'Female'},
-        ],
-        'favorite_color': [
-            {'value': 'red', 'name': 'Red'},
-            {'value': 'blue', 'name': 'Blue'},
-            {'value': 'green', 'name': 'Green'},
-            {'value': 'yellow', 'name': 'Yellow'},
-            {'value': 'purple', 'name': 'Purple'},
-            {'value': 'orange', 'name': 'Orange'},
-            {'value': 'pink', 'name': 'Pink'},
-            {'value': 'black', 'name': 'Black'},
-            {'value': 'white', 'name': 'White'},
-            {'value': 'brown', 'name': 'Brown'},
-        ]
-    }
-    return Response(options)
+    return Response(AVATAR_OPTIONS)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@read_only
 def available_games(request):
     """Get available game sessions"""
     sessions = GameSession.objects.filter(
@@ -161,6 +291,7 @@ def create_game(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([JoinGameThrottle])
 def join_game(request, session_id):
     """Join a game session"""
     session = get_object_or_404(GameSession, session_id=session_id)
@@ -172,46 +303,143 @@ def join_game(request, session_id):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     # Check if game is full
-    if session.players.count() >= session.max_players:
+    if session.player_count >= session.max_players:
         return Response({
             'error': 'Game is full'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if user has enough balance
-    if request.user.balance < session.entry_fee:
+    # A user removed from the session pays again to rejoin, so the key counts earlier fees
+    attempt = BalanceTransaction.objects.filter(user=request.user, session=session, kind='entry_fee').count()
+    
+    try:
+        with transaction.atomic():
+            # Deduct entry fee; the conditional update is the balance check
+            _, charged = ledger.post(
+                request.user.pk, -session.entry_fee, 'entry_fee',
+                ledger.entry_fee_key(session, request.user.pk, attempt), session=session
+            )
+            if not charged:
+                # A concurrent join by the same user posted this fee first
+                return Response({
+                    'error': 'Already joined this game'
+                }, status=status.HTTP_409_CONFLICT)
+            
+            # Add to prize pool
+            GameSession.objects.filter(pk=session.pk).update(prize_pool=F('prize_pool') + session.entry_fee)
+            transaction.on_commit(lambda: session_cache.invalidate(str(session.session_id)))
+            
+            # Find next available player number
+            taken_numbers = set(session.players.values_list('player_number', flat=True))
+            player_number = next(i for i in range(1, session.max_players + 1) if i not in taken_numbers)
+            
+            # Create player
+            player = Player.objects.create(
+                user=request.user,
+                session=session,
+                player_number=player_number
+            )
+    except ledger.InsufficientBalance:
         return Response({
             'error': 'Insufficient balance'
         }, status=status.HTTP_400_BAD_REQUEST)
+    except IntegrityError:
+        # Another join took the same seat; the fee deduction was rolled back
+        return Response({
+            'error': 'Seat was taken, please retry'
+        }, status=status.HTTP_409_CONFLICT)
     
-    # Deduct entry fee
-    request.user.balance -= session.entry_fee
-    request.user.save()
-    
-    # Add to prize pool
-    session.prize_pool += session.entry_fee
-    session.save()
-    
-    # Find next available player number
-    taken_numbers = set(session.players.values_list('player_number', flat=True))
-    player_number = next(i for i in range(1, session.max_players + 1) if i not in taken_numbers)
-    
-    # Create player
-    player = Player.objects.create(
-        user=request.user,
-        session=session,
-        player_number=player_number
-    )
+    # Late joiners in the lobby need their tile in the sprite atlas
+    if session.status == 'lobby':
+        schedule_atlas_build(session.session_id)
     
     return Response({
         'message': 'Successfully joined game',
         'player_number': player_number
     })
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@read_only
+def game_events(request, session_id):
+    """Answers, chat and movements of a game the user played, archived or not"""
+    session = get_object_or_404(GameSession, session_id=session_id)
+    if not session.players.filter(user=request.user).exists():
+        return Response({
+            'error': 'You did not play in this game'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response({
+        'session_id': session.session_id,
+        **session_events(session)
+    })
+
+ELIMINATION_STAGES = {1: 'quiz', 2: 'red_light'}
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@read_only
+def game_history(request):
+    """Games the user has played, newest first, paginated by cursor"""
+    try:
+        limit = min(100, max(1, int(request.query_params.get('limit', 20))))
+    except ValueError:
+        return Response({
+            'error': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    players = Player.objects.filter(user=request.user)
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            joined_at, player_id = decode_datetime_cursor(cursor)
+        except ValueError:
+            return Response({
+                'error': 'Invalid cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # (joined_at, id) < cursor, written so the range bound stays sargable
+        players = players.filter(joined_at__lte=joined_at).exclude(
+            joined_at=joined_at, id__gte=player_id
+        )
+
+    rows = list(players.order_by('-joined_at', '-id').values(
+        'id', 'joined_at', 'player_number', 'is_alive', 'elimination_stage', 'final_prize',
+        'session__session_id', 'session__status', 'session__started_at', 'session__finished_at'
+    )[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['joined_at'], rows[-1]['id'])
+
+    results = []
+    for row in rows:
+        if row['is_alive']:
+            stage_reached = row['session__status']
+        else:
+            stage_reached = ELIMINATION_STAGES.get(row['elimination_stage'], row['session__status'])
+        results.append({
+            'session_id': row['session__session_id'],
+            'status': row['session__status'],
+            'player_number': row['player_number'],
+            'is_alive': row['is_alive'],
+            'stage_reached': stage_reached,
+            'final_prize': f"{row['final_prize']:.2f}",
+            'joined_at': row['joined_at'],
+            'started_at': row['session__started_at'],
+            'finished_at': row['session__finished_at']
+        })
+
+    return Response({
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def quiz_questions(request):
     """Get quiz questions for the game"""
-    questions = QuizQuestion.objects.filter(is_active=True).order_by('?')[:6]
+    pool = get_quiz_question_pool()
+    questions = random.sample(pool, min(6, len(pool)))
     
     questions_data = []
     for question in questions:
@@ -232,3 +460,98 @@ def quiz_questions(request):
         'questions': questions_data,
         'total_questions': len(questions_data)
     })
+
+def _leaderboard_period(request):
+    period = request.query_params.get('period', 'global')
+    if period not in leaderboard.PERIODS:
+        return None
+    return period
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@read_only
+def leaderboard_view(request):
+    """Global, daily or weekly earnings leaderboard"""
+    period = _leaderboard_period(request)
+    if period is None:
+        return Response({
+            'error': f"period must be one of {', '.join(leaderboard.PERIODS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        offset = max(0, int(request.query_params.get('offset', 0)))
+        limit = min(100, max(1, int(request.query_params.get('limit', 20))))
+    except ValueError:
+        return Response({
+            'error': 'offset and limit must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results, total = leaderboard.get_page(period, offset, limit)
+    except RedisError as e:
+        logger.error(f"Error reading leaderboard: {str(e)}")
+        return Response({
+            'error': 'Leaderboard temporarily unavailable'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        'period': period,
+        'count': total,
+        'offset': offset,
+        'limit': limit,
+        'results': results
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard_rank(request):
+    """Current user's rank on a leaderboard"""
+    period = _leaderboard_period(request)
+    if period is None:
+        return Response({
+            'error': f"period must be one of {', '.join(leaderboard.PERIODS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        rank, earnings = leaderboard.get_rank(period, request.user.id)
+    except RedisError as e:
+        logger.error(f"Error reading leaderboard rank: {str(e)}")
+        return Response({
+            'error': 'Leaderboard temporarily unavailable'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        'period': period,
+        'rank': rank,
+        'earnings': earnings
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export_data(request, dataset, fmt):
+    """Stream session results, answers or chat as CSV/JSONL; ?session=<uuid> (repeatable), ?gzip=1"""
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        return Response({
+            'error': f"Exports are {', '.join(exports.DATASETS)} as {', '.join(exports.FORMATS)}"
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        session_ids = [uuid.UUID(value) for value in request.query_params.getlist('session')]
+    except ValueError:
+        return Response({
+            'error': 'session must be a session UUID'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    gzip = request.query_params.get('gzip', '').lower() in ('1', 'true')
+
+    # The body is produced after this view returns, outside any read_only
+    # scope, so the database is picked now
+    with read_only():
+        using = router.db_for_read(exports.DATASETS[dataset][0])
+    chunks = exports.export(dataset, fmt, session_ids or None, using=using, gzip=gzip)
+    if isinstance(request._request, ASGIRequest):
+        chunks = exports.async_chunks(chunks)
+
+    filename = f'{dataset}.{fmt}.gz' if gzip else f'{dataset}.{fmt}'
+    response = StreamingHttpResponse(
+        chunks, content_type='application/gzip' if gzip else exports.FORMATS[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response